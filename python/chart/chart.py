@@ -106,6 +106,10 @@ from features import ImmutableCategory as icat
 import operator
 import itertools
 import heapq
+import sys
+from math import log
+from StringIO import StringIO
+import serialize
 
 
 def hpush(heap,item):
@@ -130,6 +134,9 @@ def hpop(heap):
 # from heapq import heappush as hpush
 
 
+RULE_SCORE = -1.0  # the score of a rule, when the grammar has no probabilities
+
+
 class LinearWords(object):
     """
     A class that implements the finite state machine abstraction 
@@ -155,6 +162,112 @@ class LinearWords(object):
             yield i,w , i+1
 
 from edges import Edge
+import forest
+import pcfg
+
+
+class BottomUpStrategy(object):
+
+    """
+    The default strategy: every new complete edge spawns the
+    rules that it can start, whatever may be expected there.
+
+    A strategy decides which empty edges the chart predicts.
+    `initialize` is called once the words are on the agenda,
+    `predict_from_complete` with each new complete edge, and
+    `predict_from_partial` with each new partial edge.
+    """
+
+    def initialize(self, chart):
+        pass
+
+    def predict_from_complete(self, chart, e):
+        chart.spawn(e.label, e.left)
+
+    def predict_from_partial(self, chart, e):
+        pass
+
+
+class TopDownStrategy(BottomUpStrategy):
+
+    """
+    Earley-style prediction: the chart starts from the rules for
+    `topcat` at the start state, and each new partial edge predicts the
+    rules for the category it needs next, where it ends. Complete edges
+    predict nothing. The words are looked up as before, and their
+    preterminals are used only where a partial edge asks for them.
+
+    Each category is predicted at most once in each state,
+    so left-recursive rules are predicted once and stop.
+
+    Parameters
+    ----------
+    topcat: string or Category, optional
+        the category of the solutions. By default, the
+        `topcat` of the chart. For a grammar with `variants`, such as
+        `features.ExpandedGrammar`, each of the symbols that stand
+        for it is predicted.
+
+    Examples
+    --------
+
+    Rules that can never be used in a sentence still fire bottom up.
+    Here a hundred of them start with a determiner:
+
+    >>> extra = '\\n'.join('X%d -> det n n' % k for k in range(100))
+    >>> g = english.Grammar(english.RULES + '\\n' + extra, english.WORDS)
+    >>> words = 'the pigeons are punished and they suffer'.split()
+    >>> bottom_up, top_down = Chart(words, grammar=g), Chart(words, grammar=g, strategy=TopDownStrategy())
+    >>> edge_summary(bottom_up), edge_summary(top_down)
+    ({'partials': 360, 'completes': 26}, {'partials': 69, 'completes': 22})
+    >>> top_down.solutions('S') == bottom_up.solutions('S')
+    True
+
+    The top category is the one the chart is parsing for:
+
+    >>> ch = Chart('show me a movie'.split(), topcat='SImp', strategy=TopDownStrategy())
+    >>> ch.solutions('SImp')
+    [C(SImp, 0, 4)]
+    >>> ch = Chart('the pigeons suffer'.split(), using_features=True, strategy=TopDownStrategy())
+    >>> ch.solutions(ch.topcat)
+    [C(S(num:pl), 0, 3)]
+    """
+
+    def __init__(self, topcat=None):
+        self.topcat = topcat
+
+    def initialize(self, chart):
+        chart.predicted = set()
+        topcat = chart.topcat if self.topcat is None else self.topcat
+        if chart.using_features and isinstance(topcat, basestring):
+            topcat = icat.from_string(topcat)
+        tops = [topcat] if chart.variants is None else sorted(chart.variants(topcat))
+        for cat in tops:
+            self.predict(chart, cat, chart.start_state)
+
+    def predict_from_complete(self, chart, e):
+        pass
+
+    def predict_from_partial(self, chart, e):
+        self.predict(chart, e.needed[0], e.right)
+
+    def predict(self, chart, cat, i):
+        """
+        Put the empty edges for the rules that can make `cat` at `i` on the agenda.
+        """
+        if (cat, i) in chart.predicted:
+            return
+        chart.predicted.add((cat, i))
+        for rule in chart.expansions.get(chart.key(cat), ()):
+            if chart.compat(cat, rule.lhs):
+                e = Edge(label=rule.lhs, left=i, right=i,
+                         needed=tuple(rule.rhs),
+                         constraints=rule.constraints)
+                if chart.propagate_down:
+                    e = e.instantiate(cat)
+                if e is not None and e not in chart.partials[i]:
+                    chart.prev[e] = set()
+                    chart.push(e)
 
 
 
@@ -169,11 +282,43 @@ class Chart(object):
     words: list of string.
         the words to be parsed.
     grammar: Grammar
-        the grammar to parse against.
+        the grammar to parse against. If omitted, the default
+        English grammar for the mode is fetched from the grammar cache.
+        Any object will do that has, like `english.Grammar`, the attributes
+        `grammar` (the list of rules), `lexicon` (a mapping from words to
+        their categories), `first` and `expansions` (the rules indexed by the
+        key of their first right-hand-side symbol and of their left-hand
+        side), and `key` (a function from a category to its index key).
+        `variants`, `feature_tree`, `rule_logprobs`, `word_logprobs`,
+        `outside_estimates`, `slice` and `state` are used if present,
+        by the options that need them.
     verbose: boolean
         provide more logging if true.
     using_features: boolean
         use categories with features on them if true.
+    beam: integer, optional
+        if given, keep at most this many complete edges for each span.
+    margin: float, optional
+        if given, drop complete edges that score more than this
+        much below the best edge for their span.
+    strategy: BottomUpStrategy, optional
+        decides which rules the chart predicts. By default, the
+        chart is bottom up; see also `TopDownStrategy`.
+    propagate_down: boolean
+        with features and `TopDownStrategy`, give each predicted rule
+        the values of the reentrant features of the category it is
+        predicted for, and copy them on to the categories it still needs,
+        so that edges that could never agree are not built. It only affects
+        these predictions: bottom up, the fundamental rule already passes
+        the values of the daughters on to what is still needed.
+    slice_for: category, optional
+        if given, a top category. Once the words are seeded, the chart
+        parses against the slice of the grammar (see `features.Grammar.slice`)
+        that the lexical categories of the words can build up to it.
+        Only feature grammars can be sliced.
+    topcat: string or Category
+        the category that the input is parsed as, used by strategies that
+        predict top down. With features, a string is read as a category.
 
     Attributes
     ----------
@@ -187,53 +332,290 @@ class Chart(object):
     prev: defaultdict of set of Edge
         mapping from edges to the complete edges that 
         gave rise to them: empty for edges not created by fundamental rule
+    changes: integer
+        goes up whenever an edge is incorporated or a predecessor is
+        recorded, so that forests and counts made from the chart
+        can be kept until it changes.
     agenda: priority queue of edges
         The list of edges still remaining to be incorporated.
-
+    source_grammar: Grammar
+        the grammar being parsed against.
+    lexical_edges: set<Edge>
+        the edges for the input words themselves. Preterminal
+        edges are seeded from the lexicon with these as their predecessors.
+    inside: dict
+        when the chart is scored, the best score found for each edge:
+        its inside log-probability if the grammar has rule probabilities
+        (see `pcfg.PCFG`), and otherwise `RULE_SCORE` for each rule used.
+        None if the chart is not scored.
+    best: dict
+        when the chart is scored, the ``(p, c)`` pair that
+        each edge gets its best score from (see `push`).
+    pruned: integer
+        the number of complete edges dropped by pruning.
+
+    Pruning
+    -------
+
+    With a `beam` or a `margin`, the chart is scored and the agenda
+    becomes a priority queue, on which shorter edges come before longer
+    ones, and better edges before worse ones of the same length. No edge
+    scores better than the edges it is made from, so the complete edges
+    for each span arrive best first, after every shorter edge, and the
+    ones that are pruned are the worst for their span.
+
+    Without probabilities, each rule costs the same, so the
+    pruning favours analyses with fewer constituents:
+
+    >>> words = 'steve hit the boy in the house in the room on the computer in the cage'.split()
+    >>> def size(ch):
+    ...     return sum(edge_summary(ch).values())
+    >>> size(Chart(words)), size(Chart(words, beam=3))
+    (294, 287)
+    >>> Chart(words, beam=3).pruning_stats()
+    {'pruned': 3, 'kept': 70, 'cells': 52}
+
+    A span and its unary projections (such as ``pn`` and ``Np``) share
+    a cell, so a beam that is too narrow loses every parse:
+
+    >>> ch = Chart(words, beam=2)
+    >>> size(ch), ch.solutions('S')
+    (227, [])
+
+    With the rule probabilities of a `pcfg.PCFG`, a margin
+    is a bound on the ratio of probabilities:
+
+    >>> ch = Chart(words, grammar=pcfg.get_pcfg(), margin=1.0)
+    >>> size(ch), ch.pruning_stats()
+    (232, {'pruned': 3, 'kept': 52, 'cells': 41})
     """
 
+    scored = False
+
     def __init__(self, words, 
-                    grammar=GRAMMAR, 
+                    grammar=None, 
                     verbose=False, 
                     input_source=LinearWords, 
                     run=True, 
-                    using_features=False):
+                    using_features=False,
+                    beam=None,
+                    margin=None,
+                    strategy=None,
+                    propagate_down=False,
+                    slice_for=None,
+                    topcat='S'):
         """
         Create and run the parser.
         """
         self.using_features = using_features    
+        self.propagate_down = propagate_down and using_features
+        if slice_for is not None and not using_features:
+            raise ValueError("grammar slicing needs a feature grammar")
+        if using_features and isinstance(topcat, basestring):
+            topcat = icat.from_string(topcat)
+        self.topcat = topcat
         self.input_source = input_source
         self.verbose = verbose
+        if grammar is None:
+            grammar = (features.make_feature_grammar() if using_features
+                       else english.get_grammar())
+        self.source_grammar = grammar
         self.grammar = grammar.grammar
+        self.lexicon = grammar.lexicon
+        self.first = grammar.first
+        self.expansions = grammar.expansions
+        self.key = grammar.key
+        self.variants = getattr(grammar, 'variants', None)
         self.prev = defaultdict(set)
+        self.changes = 0
         self.countdict = defaultdict(int)
         self.agenda = []
-        self.seed_agenda(words)
+        self.beam = beam
+        self.margin = margin
+        self.pruned = 0
+        self.cells = {}
+        if self.scored or beam is not None or margin is not None:
+            self.inside = {}
+            self.best = {}
+            self.tiebreak = itertools.count()
+            self.rule_logprobs = getattr(grammar, 'rule_logprobs', None)
+            self.word_logprobs = getattr(grammar, 'word_logprobs', None)
+        else:
+            self.inside = None
+        self.strategy = BottomUpStrategy() if strategy is None else strategy
         if self.using_features:
             self.compat = self.compatible
         else:
             self.compat = operator.eq
+        self.seed_agenda(words)
+        if slice_for is not None:
+            self.use_grammar(grammar.slice(self.lexical_categories(), slice_for))
+        self.strategy.initialize(self)
         
         if run:
-            while self.agenda:
+            self.run()
+
+    def lexical_categories(self):
+        """
+        The categories that the lexicon gives the words seeded so far.
+        """
+        return set(cat for e in self.lexical_edges
+                   for cat in self.lexicon.get(self.key(e.label), ()))
+
+    def use_grammar(self, grammar):
+        """
+        Parse against `grammar` from now on.
+
+        >>> g = features.make_feature_grammar()
+        >>> v = Chart('the pigeons suffer'.split(), grammar=g, using_features=True, slice_for='S')
+        >>> len(v.grammar), len(v.solutions(features.ImmutableCategory.from_string('S')))
+        (6, 1)
+
+        Slicing takes a feature grammar, and passes its random state on
+        as it is, so that numpy is not imported for it:
+
+        >>> g = features.build_feature_grammar(english.RULES, english.WORDS)
+        >>> Chart('the pigeons suffer'.split(), grammar=g, using_features=True, slice_for='S').source_grammar._state is None
+        True
+        >>> Chart('the pigeons suffer'.split(), slice_for='S')
+        Traceback (most recent call last):
+        ...
+        ValueError: grammar slicing needs a feature grammar
+        """
+        self.source_grammar = grammar
+        self.grammar = grammar.grammar
+        self.first = grammar.first
+        self.expansions = grammar.expansions
+
+    def run(self):
+        """
+        Incorporate edges from the agenda until it is empty, or
+        until `finished` says so.
+        """
+        while self.agenda:
+            if self.inside is None:
                 item = hpop(self.agenda)
-                if self.verbose:
-                    print item   #pragma no cover
-                self.incorporate(item)
+            else:
+                item = heapq.heappop(self.agenda)[-1]
+                if self.find(item) is not None:
+                    continue
+            if self.verbose:
+                print item   #pragma no cover
+            self.incorporate(item)
+            if self.finished(item):
+                break
+
+    def finished(self, e):
+        """
+        True if the parse can stop now that `e` has been incorporated.
+        """
+        return False
+
+    def push(self, e, p=None, c=None):
+        """
+        Put `e` on the agenda, recording that it was made by
+        extending the partial edge `p` with the complete edge `c`.
+        `p` is None for a preterminal seeded from the word edge `c`,
+        and both are None for words and the empty edges made by `spawn`.
+
+        When the chart is scored, `e` is put on the agenda
+        only if this improves on its score so far.
+        """
+        if c is not None:
+            self.add_prev(e, c)
+        if self.inside is None:
+            hpush(self.agenda, e)
+            return
+        score = self.edge_score(e, p, c)
+        if score > self.inside.get(e, -forest.INFINITE):
+            self.inside[e] = score
+            self.best[e] = (p, c)
+            heapq.heappush(self.agenda, self.priority(e, score) + (next(self.tiebreak), e))
+
+    def priority(self, e, score):
+        """
+        The key of `e` on a scored agenda, smallest first:
+        shorter edges first, then better ones.
+        """
+        return (e.right - e.left, -score)
+
+    def edge_score(self, e, p, c):
+        """
+        The score of `e`, made from `p` and `c` as described in `push`.
+        """
+        if c is None:
+            if not e.needed:
+                return self.arc_weight(e)
+            if self.rule_logprobs is None:
+                return RULE_SCORE
+            return self.rule_logprobs[e.label, e.needed]
+        elif p is None:
+            if self.word_logprobs is None:
+                return self.arc_weight(c)
+            return self.word_logprobs[e.label, (c.label,)] + self.arc_weight(c)
+        return self.inside[p] + self.inside[c]
+
+    def arc_weight(self, word):
+        """
+        The score of the input arc for the word edge `word`: 0
+        unless the input source has `weights`, as a
+        `lattice.WeightedLatticeWords` does.
+        """
+        if self.arc_weights is None:
+            return 0.0
+        return self.arc_weights.get((word.left, word.label, word.right), 0.0)
+
+    def prune(self, e):
+        """
+        Decide whether to drop the new complete edge `e`, keeping
+        count of the edges kept for each span in `cells`.
+        Words are never pruned.
+        """
+        if (self.beam is None and self.margin is None) or e in self.lexical_edges:
+            return False
+        score = self.inside[e]
+        cell = self.cells.get((e.left, e.right))
+        if cell is None:
+            self.cells[e.left, e.right] = [1, score]
+            return False
+        if ((self.beam is not None and cell[0] >= self.beam) or
+                (self.margin is not None and score < cell[1] - self.margin)):
+            self.pruned += 1
+            return True
+        cell[0] += 1
+        return False
+
+    def pruning_stats(self):
+        """
+        Report how many spans had complete edges, and how many
+        of those edges were kept and pruned.
+        """
+        return dict(cells=len(self.cells),
+                    kept=sum(n for n, _ in self.cells.values()),
+                    pruned=self.pruned)
 
-    def show(self):
+    def show(self, out=None):
+        """
+        Write the edges of the chart to `out`, by default
+        standard output, one to a line, partial edges first.
+        """
+        if out is None:
+            out = sys.stdout
         for p in self.partials:
             for e in p:
-                print e
+                print >>out, e
         for c in self.completes:
             for e in c:
-                print e
+                print >>out, e
                     
 
     def setup_words(self, words):
         """
-        Instantiate the source of words.
+        Instantiate the source of words. An input source that has
+        already been made, such as a lattice read from a file, is used as it is.
         """
+        if hasattr(words, 'arcs'):
+            return words
         if self.using_features:
             words = [icat.from_string(w) for w in words]
 
@@ -255,9 +637,42 @@ class Chart(object):
 
         self.partials =  [set() for _ in range(final_state + 1)]
         self.completes = [set() for _ in range(final_state + 1)]
+        self.lexical_edges = set()
+        self.arc_weights = getattr(words, 'weights', None)
+        self.start_state = getattr(words, 'start_state', 0)
+        self.final_states = frozenset(getattr(words, 'final_states', (final_state,)))
 
         for i,w,j in words.arcs():
-             hpush(self.agenda,self.lexical(i,w,j))
+            self.seed_word(i, w, j)
+
+    def seed_word(self, i, w, j):
+        """
+        Put the edges for one word arc on the agenda: the
+        edge for the word itself, and a complete preterminal
+        edge for each of its categories in the lexicon.
+
+        The lexicon is a hash map, so lexical entries never reach
+        `spawn`, which sees only the phrasal rules.
+
+        >>> ch = Chart([], run=False)
+        >>> ch.seed_word(0, 'by', 1)
+        >>> sorted(ch.agenda)
+        [C(by, 0, 1), C(passmarker, 0, 1), C(prep, 0, 1)]
+        >>> ch.get_prev(Edge('prep', 0, 1, (), None))
+        set([C(by, 0, 1)])
+        """
+        word = self.lexical(i, w, j)
+        self.lexical_edges.add(word)
+        for cat in self.lexicon.get(self.key(w), ()):
+            self.push(Edge(label=cat, left=i, right=j, needed=(), constraints=None), None, word)
+        self.push(word)
+
+    def is_lexical(self, e, c):
+        """
+        True if the preterminal edge `e` was seeded from the lexicon for
+        the word edge `c`, rather than built by the fundamental rule.
+        """
+        return c in self.lexical_edges and c.left == e.left and c.right == e.right
 
     def lexical(self, i, word, j):
         """
@@ -275,22 +690,40 @@ class Chart(object):
         """
         return Edge(label=word, left=i, right=j, needed=(),constraints=None)
 
-    def solutions(self, topCat,n=None):
+    def solutions(self, topCat,n=None, start=None, final=None):
         """
         Find the solutions rooted in `topCat`
 
         Parameters
         ----------
         topCat: string
-            the symbol that the sentence should be rooted in.
+            the symbol that the sentence should be rooted in. For a
+            grammar with `variants`, such as `features.ExpandedGrammar`,
+            any of the symbols that stand for it.
+        start: integer, optional
+            the state the solutions start in. By default,
+            the start state of the input.
+        final: integer, optional
+            the state the solutions end in. By default, any
+            of the final states of the input.
         
         Returns
         -------
         solutions:list<Edge>
-        
+
+        >>> v = parse('the pigeons suffer'.split(), return_chart=True, print_trees=False)
+        >>> v.solutions('S'), v.solutions('Np', final=2), v.solutions('Vp', start=2)
+        ([C(S, 0, 3)], [C(Np, 0, 2)], [C(Vp, 2, 3)])
         """
-        r = [e for e in self.completes[0] if
-                e.right == len(self.completes) - 1 and self.compat(topCat,e.label)]
+        if start is None:
+            start = self.start_state
+        finals = self.final_states if final is None else (final,)
+        if self.variants is not None:
+            tops = self.variants(topCat)
+            r = [e for e in self.completes[start] if e.right in finals and e.label in tops]
+        else:
+            r = [e for e in self.completes[start] if
+                    e.right in finals and self.compat(topCat,e.label)]
         if n is not None:
             return r[n]
         else:
@@ -317,6 +750,7 @@ class Chart(object):
 
         """
         self.prev[e].add(c)
+        self.changes += 1
         return e
 
     def get_prev(self, e):
@@ -361,8 +795,7 @@ class Chart(object):
                                         constraints=p.constraints)
                 if self.using_features:
                     newedge = newedge.percolate(e.label)
-                hpush(self.agenda,
-                       self.add_prev(newedge, e))
+                self.push(newedge, p, e)
 
     def pairwithcompletes(self, e, completes):
         """
@@ -393,7 +826,7 @@ class Chart(object):
                                        constraints=e.constraints)
                 if self.using_features:
                     newedge = newedge.percolate(c.label)
-                hpush(self.agenda,self.add_prev(newedge, c))
+                self.push(newedge, e, c)
 
     def compatible(self,rule_category, chart_category):
         """
@@ -430,7 +863,7 @@ class Chart(object):
 
 
         """
-        for rule in self.grammar:
+        for rule in self.first.get(self.key(lc), ()):
             lhs = rule.lhs
             rhs = rule.rhs
             if self.compat(rhs[0], lc):
@@ -440,7 +873,7 @@ class Chart(object):
                          )
                 if e not in self.somepartials(right=e.left):
                     self.prev[e] = set()
-                    hpush(self.agenda,e)
+                    self.push(e)
 
     def find(self,e):
         if e.iscomplete():
@@ -448,6 +881,9 @@ class Chart(object):
         else:
             edges = self.partials[e.right]
 
+        if not self.using_features:
+            return e if e in edges else None
+
         # there will be zero or one edge in the chart that satisfies
         # the criteria...
         for edge in edges:
@@ -509,16 +945,19 @@ class Chart(object):
         set([C(np, 0, 1)])
 
         """
+        self.changes += 1
         if e.iscomplete():
             flag,self.completes[e.left] = self.membership_check(e, self.completes[e.left])
             if flag:  # no new edge needs to be added
                 pass
+            elif self.inside is not None and self.prune(e):
+                pass
             else:
                 self.completes[e.left].add(e)
                 # TODO the empty edge produced by spawn
                 # will immedidately combine with e
                 # so we could make the result directly.
-                self.spawn(e.label, e.left)
+                self.strategy.predict_from_complete(self, e)
                 self.pairwithpartials(self.somepartials(right=e.left), e)
         elif e.ispartial():
 
@@ -528,6 +967,7 @@ class Chart(object):
             else:
                 self.partials[e.right].add(e)
                 self.pairwithcompletes(e, self.completes[e.right])
+                self.strategy.predict_from_partial(self, e)
         else:
             raise "Huh? edge has to be either partial or complete!"  #pragma no cover
 
@@ -549,12 +989,24 @@ class Chart(object):
 
 
 
-    def count_edges(self,sol=None):
+    def count_edges(self, sol=None, log=False):
         """
-        Recursive (memoized) procedure to find counts
-        of edges. 
+        Count the trees rooted in the solutions.
 
-        XXX Answer is not sensible parsing of infinite strings. The procedure runs but is misleading.
+        This is a single bottom-up pass over the packed forest
+        (see `forest.Forest.counts`), so it takes time linear in the
+        size of the chart and is not limited by Python's recursion limit.
+        If the forest is cyclic, as it can be for a cyclic lattice, there
+        are infinitely many trees, and the answer is `forest.INFINITE`.
+
+        Parameters
+        ----------
+        sol: Edge, optional
+            count the trees rooted in this edge instead, as `count` does.
+            Kept for older callers; new code should call `count`.
+        log: boolean
+            if true, return the natural logarithm of the count,
+            as a float, instead of the exact integer.
 
         >>> v = parse(('the pigeons are punished' + ( ' and they suffer' * 4)).split(),return_chart=True, print_trees=False)
         >>> v.count_edges()
@@ -562,40 +1014,25 @@ class Chart(object):
         >>> v = parse(('the pigeons are punished' + ( ' and they suffer' * 5)).split(),return_chart=True, print_trees=False)
         >>> v.count_edges()
         42
-        """
-        if sol is None:
-            self._traced = dict()
-            s = 0
-            for sol in self.solutions(self.topcat):
-                self.count_edges(sol=sol)
-                s += self._traced[sol]
-            return s
-        elif sol in self._traced:
-            pass
-        else:
-            ps = self.prev[sol]
-            if ps:
-                self._traced[sol] = 0
-                for e in ps:
-                    probe = Edge(label=sol.label,
-                                left=sol.left,
-                                right=e.left,
-                                needed = (e.label,) + sol.needed,
-                                constraints=sol.constraints)
-                    probe = self.find(probe)
-                    self.count_edges(sol=probe)
-                    self.count_edges(sol=e)
-                    self._traced[sol] += self._traced[e] * self._traced[probe]
-            else:
-                self._traced[sol] = 1
 
+        Exact big integers, or logarithms:
 
-    
-
+        >>> v = parse(('the pigeons are punished' + ( ' and they suffer' * 50)).split(),return_chart=True, print_trees=False)
+        >>> from math import log10
+        >>> round(log10(v.count_edges()), 6)
+        27.296284
+        >>> round(v.count_edges(log=True) / log(10), 6)
+        27.296284
+        """
+        if sol is not None:
+            if log:
+                return forest.from_chart(self, [sol]).count(log=True)
+            return self.count(sol)
+        return self.forest().count(log=log)
 
     def count(self,e):
         """
-        Count the trees that are rooted in edge.
+        Count the trees that are rooted in edge. See `count_edges`.
 
         Parameters
         ==========
@@ -642,10 +1079,35 @@ class Chart(object):
         >>> v.count(v.solutions(v.topcat,0))
         429
 
+        The counts of every edge in the chart come from one forest,
+        which is kept until the chart changes, so counting all the
+        edges takes one pass, not one for each edge:
+
+        >>> counts = [v.count(e) for c in v.completes for e in c]
+        >>> max(counts), v.count_edges(v.solutions(v.topcat, 0))
+        (429, 429)
+        """
+        counts = self.edge_counts()
+        if e in counts:
+            return counts[e]
+        return forest.from_chart(self, [e]).count()
+
+    def edge_counts(self):
+        """
+        A dict from each edge in the chart to the number of trees
+        rooted in it, made from one forest of the whole chart, and
+        kept until the chart changes.
         """
-        if not hasattr(self,'_traced'):
-            self.count_edges()
-        return self._traced[e]
+        cached = getattr(self, '_edge_counts', None)
+        if cached is not None and cached[0] == self.changes:
+            return cached[1]
+        roots = [e for cell in self.completes for e in cell]
+        roots.extend(e for cell in self.partials for e in cell)
+        f = forest.from_chart(self, roots)
+        counts = f.counts()
+        r = dict((e, counts[i]) for e, i in zip(roots, f.roots))
+        self._edge_counts = (self.changes, r)
+        return r
 
 
 
@@ -670,6 +1132,143 @@ class Chart(object):
              r = {e for e in r if self.allcompatible(e.needed[1:],rest)}
         return frozenset(r)
 
+    def is_empty(self, e):
+        """
+        True for the empty partial edges made by `spawn`.
+        """
+        return e.left == e.right and e.ispartial()
+
+    def partners(self, e, c):
+        """
+        The partial edges that the complete edge `c` extended to make `e`.
+
+        Without features the partner is known exactly, and is found
+        by hashing. With features, compatible partners are searched for.
+        """
+        if not self.using_features:
+            probe = Edge(label=e.label, left=e.left, right=c.left,
+                         needed=(c.label,) + e.needed, constraints=e.constraints)
+            return (probe,) if probe in self.partials[c.left] else ()
+        return self.somepartials(right=c.left,left=e.left,label=e.label,first=c.label,rest=e.needed)
+
+    def derivations(self, e):
+        """
+        The ways in which `e` was built, as pairs ``(p, c)`` of a
+        partial edge and the complete edge that extended it. For a
+        preterminal seeded from the lexicon, `p` is None and `c` is
+        the word edge. Edges made by `spawn`, and words, have none.
+
+        >>> v = parse(['they', 'suffer'], return_chart=True, print_trees=False)
+        >>> v.derivations(v.solutions('S', 0))
+        [(P(S, 0, 1,('Vp',)), C(Vp, 1, 2))]
+        >>> v.derivations(Edge('pn', 0, 1, (), None))
+        [(None, C(they, 0, 1))]
+        """
+        r = []
+        for c in self.prev.get(e, ()):
+            if self.is_lexical(e, c):
+                r.append((None, c))
+            else:
+                r.extend((p, c) for p in self.partners(e, c))
+        return r
+
+    def forest(self, topcat=None):
+        """
+        Return the packed forest of the analyses rooted in `topcat`
+        (by default, the chart's own `topcat`). See `forest.Forest`.
+        """
+        if topcat is None:
+            topcat = self.topcat
+        return forest.from_chart(self, self.solutions(topcat))
+
+    def edge_forest(self, e):
+        """
+        The forest rooted in `e` and its node counts, kept
+        until the chart changes.
+        """
+        key = (e, self.changes)
+        try:
+            return self._forests[key]
+        except AttributeError:
+            self._forests = {}
+        except KeyError:
+            pass
+        f = forest.from_chart(self, [e])
+        r = self._forests[key] = (f, f.counts())
+        return r
+
+    def tree_at(self, e, k):
+        """
+        Build the `k`-th tree rooted in edge `e`, counting from 0, in the
+        same order as `trees`, but in time proportional to the size of
+        the tree, without building the trees before it.
+
+        >>> v = parse('stuart suffers and they suffer and they suffer'.split(), return_chart=True, print_trees=False)
+        >>> e = v.solutions(v.topcat, 0)
+        >>> for t in v.tree_range(e, 0, 5):
+        ...     serialize.write_tree(t, sys.stdout, 'penn')
+        (S (S (S (Np (pn stuart)) (Vp (v suffers))) (conj and) (S (Np (pn they)) (Vp (v suffer)))) (conj and) (S (Np (pn they)) (Vp (v suffer))))
+        (S (S (Np (pn stuart)) (Vp (v suffers))) (conj and) (S (S (Np (pn they)) (Vp (v suffer))) (conj and) (S (Np (pn they)) (Vp (v suffer)))))
+        >>> serialize.write_tree(v.tree_at(e, 1), sys.stdout, 'penn')
+        (S (S (Np (pn stuart)) (Vp (v suffers))) (conj and) (S (S (Np (pn they)) (Vp (v suffer))) (conj and) (S (Np (pn they)) (Vp (v suffer)))))
+        >>> v.tree_at(e, 2)
+        Traceback (most recent call last):
+        ...
+        IndexError: 2
+
+        >>> v = parse(('the pigeons are punished' + ' and they suffer' * 50).split(), return_chart=True, print_trees=False)
+        >>> e = v.solutions(v.topcat, 0)
+        >>> treestring(v.tree_at(e, 10 ** 27)).count('v suffer')
+        50
+        """
+        f, counts = self.edge_forest(e)
+        return f.tree_at(f.roots[0], k, Tree, counts)
+
+    def tree_range(self, e, start, stop):
+        """
+        Generate the trees rooted in edge `e` whose ranks are in
+        ``range(start, stop)``, each built directly by `tree_at`. This
+        lets a client page through parses, and lets workers split
+        the trees into disjoint ranges.
+        """
+        f, counts = self.edge_forest(e)
+        for k in xrange(start, min(stop, counts[f.roots[0]])):
+            yield f.tree_at(f.roots[0], k, Tree, counts)
+
+    def sample_trees(self, e, n, seed=None):
+        """
+        Draw `n` trees rooted in edge `e` uniformly at random, using
+        the derivation counts rather than enumeration.
+
+        Parameters
+        ----------
+        e: Edge
+            the root of the trees.
+        n: integer
+            how many trees to draw, with replacement.
+        seed: integer or numpy.random.RandomState, optional
+            where the random numbers come from. By default, the
+            grammar's `state`, so draws are reproducible from it.
+
+        >>> v = parse(('the pigeons are punished' + ' and they suffer' * 3).split(), return_chart=True, print_trees=False)
+        >>> e = v.solutions(v.topcat, 0)
+        >>> trees = [treestring(t) for t in v.trees(e)]
+        >>> draws = [trees.index(treestring(t)) for t in v.sample_trees(e, 1000, seed=42)]
+        >>> [draws.count(k) for k in range(5)]
+        [203, 188, 198, 188, 223]
+        >>> draws == [trees.index(treestring(t)) for t in v.sample_trees(e, 1000, seed=42)]
+        True
+        """
+        if seed is None:
+            state = self.source_grammar.state
+        elif hasattr(seed, 'randint'):
+            state = seed
+        else:
+            import numpy.random as npr
+            state = npr.RandomState(seed)
+        f, counts = self.edge_forest(e)
+        return f.sample(f.roots[0], n, state, Tree, counts)
+
     def trees_debug(self,e):
         import ipdb; ipdb.set_trace()
         for t in self.trees(e):
@@ -692,50 +1291,56 @@ class Chart(object):
             the chart entry whose daughters we trace.
 
         This is an iterator, and can unpack the first few of even very
-        ambiguous parse forests. The following is too costly to run as 
-        a doctest, but does work.
-
-        from math import log10
-        v = chart.parse(('the pigeons are punished' + ( ' and they suffer' * 152)).split(),return_chart=True, 
-                print_trees=False,show_chart=False)
-        print log10(v.count_edges())
-        87.98857337128997
-        ts = v.trees(v.solutions(v.topcat)[0])
-        print len((treestring(ts.next()))
-        16522
-
-
-        Currently, this does not work when the parse forest is infinite. See `demo_arcs2` in lattice. This
-        has an infinite recursion for C(S,0,4) when the input FSA is
+        ambiguous parse forests. The trees come out in rank order (see
+        `tree_at`). Each is built from the packed forest by an iterative
+        walk, so deep trees are not limited by Python's recursion limit,
+        and a subtree that is shared between trees is built once and
+        reused as a node of a DAG: the trees must be treated as immutable.
+
+        >>> v = parse(('the pigeons are punished' + ( ' and they suffer' * 60)).split(),
+        ...           return_chart=True, print_trees=False)
+        >>> ts = v.trees(v.solutions(v.topcat)[0])
+        >>> first = [ts.next() for _ in range(1000)]
+        >>> first[0].children[0] is first[1].children[0]
+        True
+
+        When the parse forest is infinite, as for `demo_arcs2` in lattice,
+        there is no first tree in rank order, and a ValueError is raised.
+        The input FSA there is
 
        0 the 1 pigeons 2 are 3  punished   4 (and 5 they 6 suffer 7)
                              3  punished   7             6 suffer 4
 
-       That is, the final state is 7. 
+       That is, the final state is 7, and S(0,4) has an infinite yield.
 
-       S(0,4) does have an infinite yield, so this is not a big surprise. 
+        >>> import lattice
+        >>> v = parse(lattice.demo_arcs2, input_source=lattice.DemoLatticeWords, return_chart=True, print_trees=False)
+        >>> v.trees(v.solutions(v.topcat, 0)).next()
+        Traceback (most recent call last):
+        ...
+        ValueError: node 32 has infinitely many trees
 
         """
-
-    
-
-        prev = self.get_prev(e)
-        if prev:
-            for c in prev:
-                for p in self.somepartials(right=c.left,left=e.left,label=e.label,first=c.label,rest=e.needed):
-                   for left in self.trees(p):
-                        for right in self.trees(c):
-                            yield Tree(e.label,left.children + tuple([right]))
-        else:
-            yield Tree(e.label)
+        f, counts = self.edge_forest(e)
+        root = f.roots[0]
+        memo = {}
+        if counts[root] == forest.INFINITE:
+            raise ValueError("node %d has infinitely many trees" % root)
+        for k in itertools.count():
+            if k >= counts[root]:
+                break
+            yield f.tree_at(root, k, Tree, counts, memo)
 
     def results(self,**kwds):
         """
         Code for creating results.
         """
-        return dict(sols=self.solutions(self.topcat),
-                    n_trees=self.count_edges(),
-                    topcat=self.topcat)
+        r = dict(sols=self.solutions(self.topcat),
+                 n_trees=self.count_edges(),
+                 topcat=self.topcat)
+        if self.beam is not None or self.margin is not None:
+            r['pruning'] = self.pruning_stats()
+        return r
         
 
 
@@ -743,6 +1348,346 @@ class Chart(object):
 
 
 
+class ViterbiChart(Chart):
+
+    """
+    A best-first chart parser for a probabilistic grammar (see
+    `pcfg.PCFG`), which stops as soon as it has found the most
+    probable analysis of the whole input as `topcat`.
+
+    The agenda is a priority queue on the inside log-probability of
+    the edges. No edge scores better than the edges it is made from,
+    so an edge has its best score by the time it is taken from the agenda,
+    and the first spanning `topcat` edge to be taken is the Viterbi parse.
+    Edges that score worse than it are never incorporated, but since
+    smaller edges score better, that is seldom many (see `best_parse`).
+
+    This depends on every score being at most 0, as log-probabilities
+    are, so that an edge can never score better than its parts. A
+    lattice with a positive arc score, or a grammar with a positive
+    rule score, would give a wrong best parse, and is refused:
+
+    >>> import lattice
+    >>> ViterbiChart(lattice.WeightedLatticeWords([(0, 'they', 1, 0.5), (1, 'suffer', 2, -1.0)]),
+    ...              input_source=lattice.WeightedLatticeWords)
+    Traceback (most recent call last):
+    ...
+    ValueError: best-first search needs arc scores of at most 0, as log-probabilities are
+
+    Only plain categories are supported.
+
+    Attributes
+    ----------
+    goal: Edge
+        the most probable spanning `topcat` edge, or None if there is no parse.
+    popped: integer
+        the number of edges taken from the agenda and incorporated.
+
+    Examples
+    --------
+
+    >>> v = ViterbiChart('steve hit the boy in the house'.split())
+    >>> v.goal
+    C(S, 0, 7)
+    >>> round(v.logprob, 6)
+    -22.600137
+    >>> print v.viterbi_tree()
+    S
+     Np
+      pn steve
+     Vp
+      v hit
+      Np
+       Np
+        det the
+        Nn
+         n boy
+       Pp
+        prep in
+        Np
+         det the
+         Nn
+          n house
+    <BLANKLINE>
+    """
+
+    scored = True
+
+    def __init__(self, words, grammar=None, topcat='S', verbose=False,
+                 input_source=LinearWords, run=True):
+        if grammar is None:
+            grammar = pcfg.get_pcfg()
+        self.goal = None
+        self.popped = 0
+        Chart.__init__(self, words, grammar=grammar, verbose=verbose,
+                       input_source=input_source, run=run, topcat=topcat)
+
+    def seed_agenda(self, words):
+        Chart.seed_agenda(self, words)
+        if self.arc_weights and max(self.arc_weights.values()) > 0:
+            raise ValueError("best-first search needs arc scores of at most 0, as log-probabilities are")
+        if self.rule_logprobs and max(self.rule_logprobs.values()) > 0:
+            raise ValueError("best-first search needs rule scores of at most 0, as log-probabilities are")
+
+    @property
+    def logprob(self):
+        """
+        The log-probability of the Viterbi parse.
+        """
+        return self.inside[self.goal]
+
+    def priority(self, e, score):
+        """
+        Best edges first, whatever their length.
+        """
+        return (-score,)
+
+    def finished(self, e):
+        """
+        Stop at the first spanning `topcat` edge.
+        """
+        self.popped += 1
+        if (e.left == self.start_state and e.right in self.final_states and
+                not e.needed and e.label == self.topcat):
+            self.goal = e
+            return True
+        return False
+
+    def best_path(self):
+        """
+        The arcs ``(i, word, j)`` that the Viterbi parse covers, left to
+        right. For a lattice, this is the best-scoring grammatical path.
+        """
+        path = []
+        stack = [self.goal]
+        while stack:
+            e = stack.pop()
+            if e in self.lexical_edges:
+                path.append((e.left, e.label, e.right))
+            else:
+                stack.extend(reversed(self.best_daughters(e)))
+        return path
+
+    def best_daughters(self, e):
+        """
+        The daughters of `e` in its best derivation, left to right.
+        """
+        ds = []
+        while True:
+            p, c = self.best[e]
+            if c is not None:
+                ds.append(c)
+            if p is None:
+                break
+            e = p
+        ds.reverse()
+        return ds
+
+    def viterbi_tree(self, e=None):
+        """
+        Build the best tree rooted in `e` (by default, `goal`)
+        from the back pointers in `best`, without recursion.
+        """
+        if e is None:
+            e = self.goal
+        stack = [(e, self.best_daughters(e)[::-1], [])]
+        while True:
+            x, todo, done = stack[-1]
+            if todo:
+                d = todo.pop()
+                stack.append((d, self.best_daughters(d)[::-1], []))
+            else:
+                stack.pop()
+                t = Tree(x.label, done)
+                if not stack:
+                    return t
+                stack[-1][2].append(t)
+
+
+class AStarChart(ViterbiChart):
+
+    """
+    A `ViterbiChart` whose agenda is ordered by the inside score of
+    each edge plus an estimate of its outside score, taken from the
+    grammar's `pcfg.OutsideEstimates`. The estimates never
+    underestimate, so the first spanning `topcat` edge to be taken is
+    still the Viterbi parse, but edges that cannot be part of a good
+    enough parse wait, and are mostly never taken.
+
+    The estimates count words, so the input must be a
+    sequence of words, not a lattice. The estimates are admissible
+    and monotone only because every score is at most 0, which is
+    checked as for `ViterbiChart`.
+
+    >>> words = 'steve hit the boy in the house in the room on the computer in the cage'.split()
+    >>> a, v = AStarChart(words), ViterbiChart(words)
+    >>> a.logprob == v.logprob
+    True
+    >>> a.popped, v.popped
+    (276, 293)
+    """
+
+    def __init__(self, words, grammar=None, topcat='S', verbose=False,
+                 input_source=LinearWords, run=True):
+        if input_source is not LinearWords:
+            raise ValueError("A* estimates need a sequence of words, not a lattice")
+        if grammar is None:
+            grammar = pcfg.get_pcfg()
+        self.n = len(words)
+        self.estimates = grammar.outside_estimates(topcat, self.n)
+        ViterbiChart.__init__(self, words, grammar=grammar, topcat=topcat, verbose=verbose,
+                              input_source=input_source, run=run)
+
+    def estimate(self, e):
+        """
+        The outside estimate for `e`. Words get 0, so that
+        they are seeded into the chart straight away.
+        """
+        if e in self.lexical_edges:
+            return 0.0
+        context = self.n - (e.right - e.left)
+        if e.needed:
+            return self.estimates.partial(e.label, e.needed, context)
+        return self.estimates.complete(e.label, context)
+
+    def priority(self, e, score):
+        return (-(score + self.estimate(e)),)
+
+
+class IncrementalChart(Chart):
+
+    """
+    A chart that is given the arcs of its input one at a time, in any
+    order, as a recognizer produces them, instead of all at once.
+
+    Each arc is parsed as soon as it is added, and the cell arrays grow
+    to fit the states it mentions. The fundamental rule pairs an edge
+    with the edges already in the chart whichever of the two arrives
+    first, so the chart that results is the same as for the whole
+    lattice at once. `solutions` answers for the final states marked
+    so far, so partial results are available while recognition goes on.
+
+    The agenda has no order to exploit, so there is no pruning
+    or best-first search here.
+
+    Parameters
+    ----------
+    arcs: sequence of ``(i, word, j)``, optional
+        arcs that are already known.
+    start: integer
+        the start state.
+    grammar, verbose, using_features:
+        as for `Chart`.
+
+    Examples
+    --------
+
+    >>> ch = IncrementalChart()
+    >>> for i, w, j in [(5, 'they', 6), (0, 'the', 1), (6, 'suffer', 7), (4, 'and', 5), (1, 'pigeons', 2)]:
+    ...     ch.add_arc(i, w, j)
+    >>> ch.solutions('S')
+    []
+    >>> ch.mark_final(7)
+    >>> ch.solutions('S'), ch.solutions('S', start=5)
+    ([], [C(S, 5, 7)])
+    >>> ch.add_arc(2, 'are', 3)
+    >>> ch.add_arc(3, 'punished', 4)
+    >>> ch.solutions('S')
+    [C(S, 0, 7)]
+
+    The chart is the one that the whole input gives at once:
+
+    >>> whole = Chart('the pigeons are punished and they suffer'.split())
+    >>> map(set, ch.completes) == map(set, whole.completes), map(set, ch.partials) == map(set, whole.partials)
+    (True, True)
+
+    Arcs that are already known can be given at the start:
+
+    >>> ch = IncrementalChart(arcs=[(0, 'they', 1), (1, 'suffer', 2)])
+    >>> ch.mark_final(2)
+    >>> ch.solutions('S')
+    [C(S, 0, 2)]
+    """
+
+    def __init__(self, arcs=(), start=0, grammar=None, verbose=False, using_features=False):
+        self.start = start
+        Chart.__init__(self, (), grammar=grammar, verbose=verbose,
+                       run=False, using_features=using_features)
+        for i, w, j in arcs:
+            self.add_arc(i, w, j)
+
+    def seed_agenda(self, arcs):
+        self.partials = []
+        self.completes = []
+        self.lexical_edges = set()
+        self.arc_weights = None
+        self.start_state = self.start
+        self.final_states = frozenset()
+
+    def grow(self, state):
+        """
+        Make room in the cell arrays for `state`.
+        """
+        n = state + 1 - len(self.partials)
+        if n > 0:
+            self.partials.extend(set() for _ in xrange(n))
+            self.completes.extend(set() for _ in xrange(n))
+
+    def add_arc(self, i, w, j):
+        """
+        Add the arc for the word `w` from state `i` to state `j`,
+        and parse with it.
+        """
+        self.grow(max(i, j))
+        if self.using_features:
+            w = icat.from_string(w)
+        self.seed_word(i, w, j)
+        self.run()
+
+    def mark_final(self, state):
+        """
+        Make `state` one of the states that `solutions` end in.
+        """
+        self.grow(state)
+        self.final_states |= frozenset([state])
+
+
+def best_parse(sentence, topcat='S', grammar=None, input_source=LinearWords):
+    """
+    Find the most probable parse of a sentence with a
+    `ViterbiChart`, and return it with its log-probability
+    as a pair, or None if there is no parse.
+
+    >>> logprob, tree = best_parse('she hit him'.split())
+    >>> round(logprob, 6)
+    -12.077171
+    >>> best_parse('she blinked'.split()) is None
+    True
+
+    The parse comes straight from the back pointers, so no forest is
+    built and the trees are never counted or enumerated, however many
+    there are. That is the saving. The search stops once the goal is found,
+    but only edges that score worse than it are left on the agenda then,
+    and for a whole sentence there are few of them: every edge over
+    fewer words scores better. Here, the best-first chart incorporates
+    all but one of the edges of the exhaustive chart, and is no quicker
+    to build. Even with outside estimates (see `AStarChart`), most of
+    them are incorporated.
+
+    >>> words = ('the pigeons are punished' + ' and they suffer' * 20).split()
+    >>> v = ViterbiChart(words)
+    >>> round(v.logprob, 6)
+    -228.229881
+    >>> ch = Chart(words)
+    >>> v.popped, AStarChart(words).popped, sum(len(c) + len(p) for c, p in zip(ch.completes, ch.partials))
+    (1339, 1292, 1340)
+    """
+    v = ViterbiChart(sentence, topcat=topcat, grammar=grammar, input_source=input_source)
+    if v.goal is None:
+        return None
+    return v.logprob, v.viterbi_tree()
+
+
 class Tree(object):
 
     """
@@ -755,11 +1700,11 @@ class Tree(object):
     children: tuple<Tree>
         the subtrees (possibly empty).
     """
-    ["parent", "children"]
-    
+    __slots__ = ("parent", "children")
+
     def __init__(self, parent, children=()):
         self.parent = parent
-        self.children = children
+        self.children = tuple(children)
     def __str__(self):
         """
         >>> print Tree("S",[Tree("NP"),Tree("VP")])
@@ -776,6 +1721,7 @@ def treestring(t, tab=0,sep=' '):
     """
 
     Return a string representation of a syntax tree.
+    To write large trees to a file, use `serialize.write_tree` instead.
     
     Print preterminals on same line as their terminals
        
@@ -807,19 +1753,17 @@ def treestring(t, tab=0,sep=' '):
    
     """
 
-    if len(t.children) == 1 and t.children[0].children == ():
-        s = (sep * tab) + str(t.parent) + ' ' + str(t.children[0].parent) + '\n'
-    else:
-        s = (sep * tab) + str(t.parent) + '\n'
-        for child in t.children:
-            s += treestring(child, tab=tab + 1,sep=sep)
-    return s
+    out = StringIO()
+    serialize.write_indented(t, out, sep=sep, tab=tab)
+    return out.getvalue()
 
 
-def parse(sentence, verbose=False, topcat='S', grammar=GRAMMAR,sep=' ', input_source=LinearWords, 
+def parse(sentence, verbose=False, topcat='S', grammar=None,sep=' ', input_source=LinearWords, 
             use_features=False,show_chart=False,print_trees=True,return_chart=False,
             trace_edges=True,
-            return_trees = False):
+            return_trees = False,
+            out=None, output_format='indented', beam=None, margin=None, strategy=None,
+            propagate_down=False, slice_grammar=False):
     """
     Print out the parses of a sentence
 
@@ -829,6 +1773,26 @@ def parse(sentence, verbose=False, topcat='S', grammar=GRAMMAR,sep=' ', input_so
 
     sentence: list<string>
         the words to be parsed.
+    grammar: Grammar
+        the grammar to parse against. If omitted, the default grammar
+        for the mode is fetched from the grammar cache.
+    out: file-like, optional
+        where to write the report: the sentence, the chart if
+        `show_chart` is true, the trees if `print_trees` is true, and
+        the number of parses. By default, standard output.
+    output_format: string
+        ``indented``, ``penn`` or ``json``, or ``packed`` to write
+        all the parses at once as a packed forest. See `serialize`.
+    beam, margin: optional
+        prune the chart, as described for `Chart`, and
+        report how many edges were pruned.
+    strategy: BottomUpStrategy, optional
+        the parsing strategy, as for `Chart`.
+    propagate_down: boolean
+        propagate features downwards too, as for `Chart`.
+    slice_grammar: boolean
+        parse against the slice of a feature grammar that the words
+        can use to build `topcat`, as for the `slice_for` of `Chart`.
 
     Examples
     --------
@@ -852,18 +1816,49 @@ def parse(sentence, verbose=False, topcat='S', grammar=GRAMMAR,sep=' ', input_so
        v suffer
     1 parses
 
+    Trees can be streamed to any file-like object, in other formats:
+
+    >>> from StringIO import StringIO
+    >>> sink = StringIO()
+    >>> parse(['they', 'suffer'], out=sink, output_format='penn')
+    >>> print sink.getvalue(),
+    ['they', 'suffer']
+    (S (Np (pn they)) (Vp (v suffer)))
+    1 parses
+
+    The ``packed`` format prints each shared constituent once,
+    however many parses it is part of:
+
+    >>> parse(('the pigeons are punished' + ' and they suffer' * 2).split(), output_format='packed')
+    ['the', 'pigeons', 'are', 'punished', 'and', 'they', 'suffer', 'and', 'they', 'suffer']
+    (S (S #17... #25) #29 #38 | #17... (S #25 #29 #38))
+    #17... 0:5 = (S (Np (det the) (Nn (n pigeons))) (cop are) (ppart punished)) (conj and)
+    #25 5:7 = (S (Np (pn they)) (Vp (v suffer)))
+    #29 7:8 = (conj and)
+    #38 8:10 = (S (Np (pn they)) (Vp (v suffer)))
+    2 parses
+
+    >>> parse(['the', 'pigeons', 'cage', 'the', 'rats'], output_format='penn', beam=2)
+    ['the', 'pigeons', 'cage', 'the', 'rats']
+    (S (Np (det the) (Nn (n pigeons))) (Vp (v cage) (Np (det the) (Nn (n rats)))))
+    1 parses
+    pruned 5 of 18 complete edges
+
      >>> parse(["the","pigeons",'are','punished','and','they','blink'])
      ['the', 'pigeons', 'are', 'punished', 'and', 'they', 'blink']
      No parse
 
     """
+    if grammar is None:
+        grammar = (features.make_feature_grammar() if use_features
+                   else english.get_grammar())
     if use_features:
-        grammar = features.make_feature_grammar()
         topcat = icat.from_string(topcat)
 
 
-    v = Chart(sentence, verbose=verbose,grammar=grammar,input_source=input_source, using_features=use_features)
-    v.topcat = topcat
+    v = Chart(sentence, verbose=verbose,grammar=grammar,input_source=input_source, using_features=use_features,
+              beam=beam, margin=margin, strategy=strategy, propagate_down=propagate_down,
+              slice_for=topcat if slice_grammar else None, topcat=topcat)
     sols = v.solutions(topcat)
 
     res = v.results(show_chart=show_chart,
@@ -872,27 +1867,35 @@ def parse(sentence, verbose=False, topcat='S', grammar=GRAMMAR,sep=' ', input_so
 
 
 
+    if out is None:
+        out = sys.stdout
     silent = not (print_trees or show_chart)
     if not silent:
-        print sentence
+        print >>out, sentence
 
     if show_chart:
-        v.show()
+        v.show(out)
 
-    if print_trees:
-        i = 0
-        for e in sols:
-            for tree in v.trees(e):
-                i += 1
-                if print_trees:
-                    print "Parse %d:" % i
-                    print treestring(tree, tab=0, sep=sep),
+    if print_trees and output_format == 'packed':
+        serialize.write_forest(v.forest(topcat), out)
+    elif print_trees:
+        if output_format == 'indented':
+            kwds = dict(headers=True, sep=sep)
+        else:
+            kwds = dict()
+        trees = (tree for e in sols for tree in v.trees(e))
+        if hasattr(grammar, 'feature_tree'):
+            trees = itertools.imap(grammar.feature_tree, trees)
+        serialize.write_trees(trees, out, output_format, **kwds)
 
     if not silent:
         if res['n_trees'] == 0:
-            print "No parse"
+            print >>out, "No parse"
         else:
-            print res['n_trees'], "parses"
+            print >>out, res['n_trees'], "parses"
+        if 'pruning' in res:
+            print >>out, "pruned %(pruned)d of %(total)d complete edges" % dict(
+                res['pruning'], total=res['pruning']['pruned'] + res['pruning']['kept'])
 
     if return_chart:
         return v
@@ -915,13 +1918,13 @@ def edge_summary(v):
       v suffer
     1 parses
     >>> edge_summary(v)
-    {'partials': 31, 'completes': 12}
+    {'partials': 28, 'completes': 12}
     """
     ps = set().union(*v.partials)
     cs = set().union(*v.completes)
     ps_no_pred = {p for p in ps if p not in v.prev}
 
-    cs_no_pred = {p for p in cs if p not in v.prev}
+    cs_no_pred = {p for p in cs if p not in v.prev and p not in v.lexical_edges}
     assert len(cs_no_pred) == 0
     assert len(ps_no_pred) == 0
     return dict(partials= len(ps),completes=len(cs))
@@ -1,6 +1,9 @@
 from collections import namedtuple
 from features import ImmutableCategory as icat
 
+NO_FEATURES = frozenset()
+NO_CONSTRAINTS = (NO_FEATURES, ())
+
 class Edge(namedtuple("Edge", ('label', 'left', 'right', 'needed','constraints'))):
     """An edge is an assertion about some span of the text. It has a left and
     right boundary, a label, and a sequence of needs. If it has no needs,
@@ -43,7 +46,7 @@ class Edge(namedtuple("Edge", ('label', 'left', 'right', 'needed','constraints')
     """
     def __new__(cls, label, left, right, needed, constraints):
         if constraints is None: 
-            constraints = (frozenset(),tuple([frozenset() for _ in needed]))
+            constraints = (NO_FEATURES, (NO_FEATURES,) * len(needed)) if needed else NO_CONSTRAINTS
         return super(Edge, cls).__new__(cls,label=label,left=left,right=right,needed=needed,constraints=constraints)
 
     def less_general(self,e):
@@ -143,6 +146,57 @@ class Edge(namedtuple("Edge", ('label', 'left', 'right', 'needed','constraints')
                     needed=newneeded,
                     constraints= (cs[0],cs[1][1:]))
 
+    def propagate_down(self):
+        """
+        Copy the features on the label down to the categories still
+        needed that share them under the rule's constraints. Return the
+        new edge, or None if a needed category already has a
+        different value, so that the edge can never be completed.
+
+        Is called, through `instantiate`, only when features are being
+        used and downward propagation has been asked for.
+
+        >>> e = Edge(label=icat.from_string('S(num:pl)'), left=0, right=0,
+        ...          needed=(icat.from_string('Np(case:subj)'), icat.from_string('Vp')),
+        ...          constraints=(frozenset(['num']), (frozenset(['num']), frozenset(['num']))))
+        >>> e.propagate_down().needed
+        (Np(case:subj,num:pl), Vp(num:pl))
+        >>> e = Edge(e.label, 0, 1, (icat.from_string('Vp(num:sing)'),), (frozenset(['num']), (frozenset(['num']),)))
+        >>> e.propagate_down() is None
+        True
+        """
+        cs = self.constraints
+        if not cs[0]:
+            return self
+        newneeded = []
+        for keys, r in zip(cs[1], self.needed):
+            for k in keys & cs[0]:
+                v = self.label.getfeat(k)
+                if v:
+                    old = r.getfeat(k)
+                    if old and old != v:
+                        return None
+                    r = r.extend(k, v)
+            newneeded.append(r)
+        return Edge(label=self.label,
+                    left=self.left,
+                    right=self.right,
+                    needed=tuple(newneeded),
+                    constraints=cs)
+
+    def instantiate(self, cat):
+        """
+        Give the label of an empty edge the values that the category
+        `cat`, which it is predicted for, has for the features that the rule
+        shares, and propagate them down, as `propagate_down` does.
+        """
+        e = Edge(label=self.label.extendc(self.constraints[0], cat),
+                 left=self.left,
+                 right=self.right,
+                 needed=self.needed,
+                 constraints=self.constraints)
+        return e.propagate_down()
+
     
     def __repr__(self):
         """
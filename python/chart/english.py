@@ -86,8 +86,8 @@ ________n eastwood
 # license: Apache 2.0
 ##
 
-from collections import namedtuple
-import numpy.random as npr
+from collections import namedtuple, defaultdict, OrderedDict
+import hashlib
 
 
 class Rule(namedtuple('Rule', ('lhs','rhs'))):
@@ -124,7 +124,31 @@ class Rule(namedtuple('Rule', ('lhs','rhs'))):
 
 
 
-class Grammar(object):
+class RandomStateMixin(object):
+
+    """
+    Gives a grammar a random state for generation and sampling.
+
+    numpy is slow to import and most uses of a grammar never need
+    random numbers, so the default state is created, and numpy
+    imported, only when `state` is first used.
+    """
+
+    _state = None
+
+    @property
+    def state(self):
+        if self._state is None:
+            import numpy.random as npr
+            self._state = npr.RandomState(42)
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        self._state = state
+
+
+class Grammar(RandomStateMixin):
 
     """
     Class for creating grammars from text strings.
@@ -133,14 +157,39 @@ class Grammar(object):
     ----------
     grammar: string
         the grammar rules, lines of the form `lhs -> rhs (|rhs)*`
-    lexicon:  string
-        the words, lines of the form `word category+`
+    lexicon:  string or lexicon
+        the words, lines of the form `word category+`, or a lexicon
+        backend such as `lexicon.MappedLexicon`, used in place of the text.
+    state: numpy.random.RandomState, optional
+        the random state. If omitted, one seeded with 42 is made on first use.
+
+    Attributes
+    ----------
+    grammar: list [Rule]
+        the phrasal rules.
+    lexicon: dict or lexicon
+        maps each word to the tuple of its (preterminal) categories.
+    first: dict
+        the phrasal rules, indexed by the key of their first right-hand-side symbol.
+    expansions: dict
+        the phrasal rules, indexed by the key of their left-hand side.
+    symbols: tuple
+        the symbol table: the sorted keys of every symbol in the phrasal rules.
+    left_corners: dict
+        for each left-hand side, the keys that can start it (reflexive
+        and transitive closure of the left-corner relation).
 
     Examples
     --------
     >>> g = Grammar(RULES, WORDS)
     >>> g.grammar[0]
     Rule(lhs='S', rhs=['Np', 'Vp'])
+    >>> g.first['Np'][0]
+    Rule(lhs='S', rhs=['Np', 'Vp'])
+    >>> sorted(g.left_corners['Pp'])
+    ['Pp', 'prep']
+    >>> g.lexicon['by']
+    ('passmarker', 'prep')
 
     """
 
@@ -149,24 +198,38 @@ class Grammar(object):
         Create a grammar from strings.
 
         """
-        self.state = (npr.RandomState(42) if state is None else state)
-        self.grammar = self.__rulify(grammar) + self.__lexicalize(lexicon)
+        self.state = state
+        self.grammar = self.__rulify(grammar)
+        if isinstance(lexicon, basestring):
+            self.lexicon = self.__lexicalize(lexicon)
+        else:
+            self.lexicon = bind_lexicon(lexicon, lexical_categories)
+        self.compile()
+
+    @staticmethod
+    def key(category):
+        """
+        The key under which a category is indexed. Plain
+        categories are their own keys.
+        """
+        return category
+
+    def compile(self):
+        """
+        Build the indexes, symbol table and closures
+        that the chart uses.
+        """
+        self.first = index_rules(self.grammar, self.key)
+        self.expansions = index_expansions(self.grammar, self.key)
+        self.symbols = symbol_table(self.grammar, self.key)
+        self.left_corners = left_corner_closure(self.grammar, self.key)
 
     def make_rule(self, lhs):
             return Rule(lhs=lhs, rhs=rhs)
 
 
     def __remove_balanced_brackets(self, string):
-        r = []
-        collecting = True
-        for ch in string:
-            if ch == "(":
-                collecting = False
-            elif ch == ")":
-                collecting = True
-            elif collecting:
-                r.append(ch)
-        return "".join(r)
+        return remove_balanced_brackets(string)
 
     def __rulify(self, s):
         r = []
@@ -181,18 +244,215 @@ class Grammar(object):
         return r
 
     def __lexicalize(self, string):
-        string = self.__remove_balanced_brackets(string)
         lines = string.split("\n")
-        rules = []
+        lexicon = {}
         for line in lines:
-            a = line.split()
-            w = a[0]
-            r = "".join(a[1:])
-            elems = r.split('|')
-            for elem in elems:
-                a = elem.split()
-                rules.append(Rule(lhs=a[0], rhs=[w]))
-        return rules
+            w, entry = line.split(None, 1)
+            lexicon[w] = lexicon.get(w, ()) + lexical_categories(entry)
+        return lexicon
+
+
+def remove_balanced_brackets(string):
+    """
+    Strip the feature specifications from grammar text.
+
+    >>> remove_balanced_brackets('Np(num,case) -> det(num) Nn(num)')
+    'Np -> det Nn'
+    """
+    r = []
+    collecting = True
+    for ch in string:
+        if ch == "(":
+            collecting = False
+        elif ch == ")":
+            collecting = True
+        elif collecting:
+            r.append(ch)
+    return "".join(r)
+
+
+def lexical_categories(entry):
+    """
+    Read the categories of one lexical entry, ignoring features.
+
+    >>> lexical_categories('v(tr:trans) | ppart')
+    ('v', 'ppart')
+    """
+    entry = "".join(remove_balanced_brackets(entry).split())
+    return tuple(elem for elem in entry.split('|') if elem)
+
+
+def bind_lexicon(lexicon, decode):
+    """
+    Prepare a lexicon backend for use by a grammar that reads
+    entries with `decode`. Anything that is already a
+    mapping from words to categories is used as it is.
+    """
+    if hasattr(lexicon, 'decoded_by'):
+        return lexicon.decoded_by(decode)
+    return lexicon
+
+
+def index_rules(rules, key):
+    """
+    Index `rules` by the key of the first symbol on their right-hand
+    side, keeping grammar order within each entry.
+
+    >>> index_rules([Rule('S', ['Np', 'Vp']), Rule('Np', ['pn'])], Grammar.key)
+    {'Np': [Rule(lhs='S', rhs=['Np', 'Vp'])], 'pn': [Rule(lhs='Np', rhs=['pn'])]}
+    """
+    index = defaultdict(list)
+    for rule in rules:
+        index[key(rule.rhs[0])].append(rule)
+    return dict(index)
+
+
+def index_expansions(rules, key):
+    """
+    Index `rules` by the key of their left-hand side,
+    keeping grammar order within each entry.
+
+    >>> index_expansions([Rule('Np', ['det', 'Nn']), Rule('S', ['Np', 'Vp']), Rule('Np', ['pn'])], Grammar.key)['Np']
+    [Rule(lhs='Np', rhs=['det', 'Nn']), Rule(lhs='Np', rhs=['pn'])]
+    """
+    index = defaultdict(list)
+    for rule in rules:
+        index[key(rule.lhs)].append(rule)
+    return dict(index)
+
+
+def symbol_table(rules, key):
+    """
+    Return the sorted keys of all the symbols mentioned in `rules`.
+
+    >>> symbol_table([Rule('S', ['Np', 'Vp']), Rule('Np', ['pn'])], Grammar.key)
+    ('Np', 'S', 'Vp', 'pn')
+    """
+    symbols = set()
+    for rule in rules:
+        symbols.add(key(rule.lhs))
+        symbols.update(key(r) for r in rule.rhs)
+    return tuple(sorted(symbols))
+
+
+def left_corner_closure(rules, key):
+    """
+    For each left-hand side, find every key that can appear as its
+    leftmost descendant, including the left-hand side itself.
+
+    >>> lc = left_corner_closure([Rule('S', ['Np', 'Vp']), Rule('Np', ['pn'])], Grammar.key)
+    >>> sorted(lc['S'])
+    ['Np', 'S', 'pn']
+    """
+    direct = defaultdict(set)
+    for rule in rules:
+        direct[key(rule.lhs)].add(key(rule.rhs[0]))
+    closure = {}
+    for lhs in direct:
+        seen = set([lhs])
+        todo = [lhs]
+        while todo:
+            for c in direct.get(todo.pop(), ()):
+                if c not in seen:
+                    seen.add(c)
+                    todo.append(c)
+        closure[lhs] = frozenset(seen)
+    return closure
+
+
+class GrammarCache(object):
+
+    """
+    A process-wide cache of compiled grammars, with least-recently-used
+    eviction.
+
+    Entries are keyed by the kind of grammar and a hash of the rule
+    and lexicon text, so that several grammars can be cached side by side.
+
+    A cached grammar is shared by every caller that asks for the same text,
+    random `state` included, so callers must not change it. Code that samples
+    should pass its own random state (as `Chart.sample_trees` allows) or
+    build a grammar of its own.
+
+    Parameters
+    ----------
+    maxsize: integer
+        the number of compiled grammars to keep.
+
+    Examples
+    --------
+    >>> cache = GrammarCache(maxsize=1)
+    >>> g = cache.get('cfg', RULES, WORDS, Grammar)
+    >>> cache.get('cfg', RULES, WORDS, Grammar) is g
+    True
+    >>> h = cache.get('cfg', RULES, "ran v", Grammar)
+    >>> cache.get('cfg', RULES, WORDS, Grammar) is g
+    False
+    >>> (cache.hits, cache.misses, len(cache))
+    (1, 3, 1)
+    """
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(kind, rules, lexicon):
+        """
+        Hash the text of a grammar. A lexicon backend
+        contributes its `cache_key` in place of text.
+        """
+        h = hashlib.sha1()
+        for part in (kind, rules, lexicon):
+            if not isinstance(part, basestring):
+                part = part.cache_key
+            if isinstance(part, unicode):
+                part = part.encode('utf-8')
+            h.update(part)
+            h.update('\0')
+        return h.hexdigest()
+
+    def get(self, kind, rules, lexicon, build):
+        """
+        Return the compiled grammar for `rules` and `lexicon`,
+        calling ``build(rules, lexicon)`` only if it is not already cached.
+        """
+        k = self.key(kind, rules, lexicon)
+        try:
+            g = self._entries.pop(k)
+            self.hits += 1
+        except KeyError:
+            g = build(rules, lexicon)
+            self.misses += 1
+        self._entries[k] = g
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return g
+
+    def clear(self):
+        self._entries.clear()
+
+
+GRAMMARS = GrammarCache()
+
+
+def get_grammar(rules=None, lexicon=None):
+    """
+    Fetch a compiled plain grammar from the process-wide cache.
+    The grammar is shared with other callers; see `GrammarCache`.
+
+    >>> get_grammar() is GRAMMAR
+    True
+    """
+    return GRAMMARS.get('cfg',
+                        RULES if rules is None else rules,
+                        WORDS if lexicon is None else lexicon,
+                        Grammar)
 
 
 RULES = """S(num) -> Np(num,case:subj) Vp(num) | S conj S
@@ -305,4 +565,4 @@ rector  n(num:sing)
 east adj"""
 
 
-GRAMMAR = Grammar(RULES, WORDS)
+GRAMMAR = get_grammar()
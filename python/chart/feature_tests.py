@@ -34,7 +34,7 @@ are entered into the chart.
 
 import chart
 from features import ImmutableCategory as icat
-from features import make_feature_grammar
+from features import make_feature_grammar, expand_feature_grammar
 import time
 
 
@@ -49,16 +49,15 @@ def too_expensive(): # pragma:no cover
 	 print "Took",(end - start),"seconds"
 	 print "Counting trees"
 	 start = time.clock()
-	 print "Log of number of trees",log10(v.trace_edges())
+	 print "Log of number of trees",log10(v.count_edges())
 	 end = time.clock()
 	 print "Took",(end - start),"seconds"
 	 print 'By best estimate this is many more trees than there are atoms in the universe'
-	 ts = v.trees(v.solutions(v.topcat)[0])
-	 tree = chart.treestring(ts.next())
+	 e = v.solutions(v.topcat)[0]
+	 tree = chart.treestring(v.tree_at(e, 0))
 	 print 'First tree has length',len(tree),'characters'
 	 print tree[:40],'...\n',tree[10000:10100],'...\n',tree[-80:]
-	 for i in range(199):
-	 	tree = chart.treestring(ts.next())
+	 tree = chart.treestring(v.tree_at(e, 199))
 	 print '200th tree has length',len(tree),'characters'
 	 print tree[:40],'...\n',tree[10000:10100],'...\n',tree[-80:]
 
@@ -134,7 +133,7 @@ def test_subsumption():
 	>>> ch.incorporate(edge)
 	>>> ps == sorted(ch.partials[2])
 	True
-	>>> sorted(ch.partials[2])[7]
+	>>> sorted(ch.partials[2])[6]
 	P(S(num:pl), 0, 2,(Vp(num:pl),))
 
 	Make sure we can build a partial edge ourselves differing only in needed field, more general. Changes set.
@@ -144,7 +143,7 @@ def test_subsumption():
 	>>> ch.incorporate(edge)
 	>>> ps == sorted(ch.partials[2])
 	False
-	>>> sorted(ch.partials[2])[7]
+	>>> sorted(ch.partials[2])[6]
 	P(S(num:pl), 0, 2,(Vp,))
 
 	Next one should have a parse because number agreement is not enforced between different branches of
@@ -190,4 +189,121 @@ def test_subsumption():
 
 
 
-	"""
\ No newline at end of file
+	"""
+
+
+def test_expanded():
+	"""
+	The expanded grammar gives the same trees as the feature
+	chart on the sentences tested here and in `features`.
+
+	>>> g = expand_feature_grammar()
+	>>> def feature_trees(words, topcat='S'):
+	...     v = chart.Chart(words, grammar=make_feature_grammar(), using_features=True)
+	...     return sorted(chart.treestring(t) for e in v.solutions(icat.from_string(topcat)) for t in v.trees(e))
+	>>> def expanded_trees(words, topcat='S'):
+	...     v = chart.Chart(words, grammar=g)
+	...     return sorted(chart.treestring(g.feature_tree(t)) for e in v.solutions(topcat) for t in v.trees(e))
+	>>> for s in ['the sheep suffers', 'the sheep suffer', 'the sheep suffered', 'the pigeon suffer',
+	...           'the pigeon suffered', 'the pigeon suffers', 'stuart suffers and they suffer',
+	...           'stuart suffers and stuart suffers', 'the pigeons are punished and they suffer']:
+	...     print len(feature_trees(s.split())), feature_trees(s.split()) == expanded_trees(s.split())
+	1 True
+	1 True
+	1 True
+	0 True
+	1 True
+	1 True
+	1 True
+	1 True
+	1 True
+	>>> expanded_trees(['pigeons'], 'Nn(num:pl)') == feature_trees(['pigeons'], 'Nn(num:pl)')
+	True
+	"""
+
+
+def test_expanded_engines():
+	"""
+	The expanded grammar gives the same trees top down, where each
+	of the symbols for ``S`` is predicted, and with the GLR parser,
+	whose tables accept any of them, as it does bottom up.
+
+	>>> import glr
+	>>> g = expand_feature_grammar()
+	>>> def trees(v):
+	...     return sorted(chart.treestring(g.feature_tree(t)) for e in v.solutions('S') for t in v.trees(e))
+	>>> for s in ['the pigeons suffer', 'the pigeon suffer', 'the sheep suffered',
+	...           'stuart suffers and they suffer', 'the pigeons are punished and they suffer']:
+	...     words = s.split()
+	...     bottom_up = trees(chart.Chart(words, grammar=g))
+	...     print len(bottom_up), [trees(v) == bottom_up for v in (chart.Chart(words, grammar=g, strategy=chart.TopDownStrategy()),
+	...                                                          glr.GLRChart(words, grammar=g))]
+	1 [True, True]
+	0 [True, True]
+	1 [True, True]
+	1 [True, True]
+	1 [True, True]
+	"""
+
+
+def test_propagate_down():
+	"""
+	Chart sizes, partials and completes together, with and
+	without downward propagation, bottom up and top down, on the
+	sentences above. Bottom up, the option does nothing: the values
+	that reach the remaining needs of an edge already come from its daughters.
+	Top down, the predicted rules take the values that are needed of
+	them, so that in 'the pigeon suffer' the plural ``Vp`` that could
+	never follow the singular subject is not built. The parses are the same, but the phrases in them
+	carry the values that were predicted for them.
+
+	>>> g = make_feature_grammar()
+	>>> S = icat.from_string('S')
+	>>> def size(words, strategy, down):
+	...     v = chart.Chart(words, grammar=g, using_features=True, strategy=strategy, propagate_down=down)
+	...     return sum(chart.edge_summary(v).values()), sum(1 for e in v.solutions(S) for t in v.trees(e))
+	>>> for s in ['the sheep suffers', 'the pigeon suffer', 'stuart suffers and they suffer',
+	...           'the pigeons are punished and they suffer']:
+	...     print [size(s.split(), st, down) for st in (None, chart.TopDownStrategy(S)) for down in (False, True)]
+	[(36, 1), (36, 1), (39, 1), (39, 1)]
+	[(33, 0), (33, 0), (37, 0), (34, 0)]
+	[(59, 1), (59, 1), (71, 1), (71, 1)]
+	[(74, 1), (74, 1), (84, 1), (84, 1)]
+	>>> v = chart.Chart('the pigeon suffered'.split(), grammar=g, using_features=True,
+	...                 strategy=chart.TopDownStrategy(S), propagate_down=True)
+	>>> print chart.treestring(v.trees(v.solutions(S)[0]).next())
+	S(num:sing)
+	 Np(num:sing)
+	  det the
+	  Nn(num:sing)
+	   n(num:sing) pigeon
+	 Vp(num:sing)
+	  v(tr:intrans) suffered
+	<BLANKLINE>
+	"""
+
+
+def test_slice():
+	"""
+	Parsing against the slice of the grammar for the words gives
+	the same trees, and leaves out the edges for rules that cannot
+	lead to an ``S``. Here the grammar is padded with rules that start
+	like a noun phrase, but need a preposition after it, so without
+	the slice each determiner and noun start a hundred of them.
+
+	>>> import english
+	>>> from features import build_feature_grammar
+	>>> pad = ''.join('\\nX%d(num) -> det(num) n(num) Y%d\\nY%d -> prep' % (i, i, i) for i in range(100))
+	>>> S = icat.from_string('S')
+	>>> for g in [make_feature_grammar(), build_feature_grammar(english.RULES + pad, english.WORDS)]:
+	...     for s in ['the sheep suffers', 'stuart suffers and they suffer', 'the pigeons are punished and they suffer']:
+	...         charts = [chart.Chart(s.split(), grammar=g, using_features=True, slice_for=top) for top in (None, S)]
+	...         trees = [sorted(chart.treestring(t) for e in v.solutions(S) for t in v.trees(e)) for v in charts]
+	...         print trees[0] == trees[1], [(len(v.grammar), sum(chart.edge_summary(v).values())) for v in charts]
+	True [(22, 36), (6, 16)]
+	True [(22, 59), (7, 35)]
+	True [(22, 74), (13, 54)]
+	True [(222, 336), (6, 16)]
+	True [(222, 59), (7, 35)]
+	True [(222, 374), (13, 54)]
+	"""
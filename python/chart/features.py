@@ -14,9 +14,12 @@ feature specifications of two types:
 	 - specification of a re-entrancy. This is a single feature value, such as ``num``. It can
 	   only occur in a rule. When found there, it enforces a consistency requirement, requiring
 	   that the feature be instantiated to the same value everywhere that the re-entrancy specification
-	   occurs. For efficiency, this consistency check is only partially enforced: feature values are 
-	   propagated "upwards" (i.e. from right-hand side to left-hand side) but not "downwards" (from 
-	   left-hand side to right hand side). That is, if we have the rule
+	   occurs. For efficiency, this consistency check is only partially enforced: by default, feature
+	   values are propagated "upwards" (i.e. from right-hand side to left-hand side) and on to later
+	   siblings, but not "downwards" (from left-hand side to right hand side). The ``propagate_down``
+	   option of `chart.Chart`, off by default, also propagates them downwards, from the category
+	   that a `chart.TopDownStrategy` predicts a rule for into the rule; bottom up, there is
+	   nothing above to propagate. That is, if we have the rule
 
 		::
 
@@ -109,10 +112,9 @@ feature specifications of two types:
 
 """
 import chart
-from collections import namedtuple,Counter
+from collections import namedtuple,Counter,defaultdict
 import re
 import english
-import numpy.random as npr
 
 
 
@@ -413,60 +415,503 @@ def compile_grammar(spec):
 	"""
 	Read the grammar and featureize it.
 
-	
+	>>> compile_grammar("S(num) -> Np(num) Vp(num) | S conj S")
+	[S -> Np Vp {lhs=num,rhs=['num', 'num']} , S -> S conj S]
 	"""
-	sp = string_pairs_from_rules(english.RULES)
+	sp = string_pairs_from_rules(spec)
 	return grammar_from_string_pairs(sp)
 
 
 def compile_lexicon(spec):
 	"""
-	Read the lexicon and put into the form of featureized rules. 
-	Use the same datastructure as for the CFG rules, except that
-	the rhs is a single string.
+	Read the lexicon into a hash map from each word to the
+	tuple of its featureized categories.
 
 	Note: the format for the lexicon is more rigid than is ideal,
 	and intolerant of extra/missing whitespace. Fixable, but hardly
 	worth fixing.
-   
 
+	>>> compile_lexicon("cage n(num:sing) | v(num:pl,tr:trans)")
+	{'cage': (n(num:sing), v(num:pl,tr:trans))}
 	"""
+	lexicon = {}
 	lines = spec.split('\n')
 	for line in lines:
-		a = line.split()
-		key = a[0]
-		cats = []
-		for x in a[1:]:
-			if x == '|':
-				pass
-			elif '|' in x:
-				for y in x.split('|'):
-					if y:
-						cats.append(y)
-			else:
-				cats.append(x)
-		for cat in cats:
-			yield ImmutableRule(lhs=cat,rhs=[key])
-
-import networkx as nx
-
-class Grammar:
-	def __init__(self, rules, state=None):
-		self.state = (npr.RandomState(42) if state is None else state)
+		key, entry = line.split(None, 1)
+		lexicon[key] = lexicon.get(key, ()) + lexical_categories(entry)
+	return lexicon
+
+
+def lexical_categories(entry):
+	"""
+	Read the featureized categories of one lexical entry.
+
+	>>> lexical_categories('v(tr:trans) | ppart')
+	(v(tr:trans), ppart)
+	"""
+	cats = []
+	for x in entry.split():
+		if x == '|':
+			pass
+		elif '|' in x:
+			for y in x.split('|'):
+				if y:
+					cats.append(y)
+		else:
+			cats.append(x)
+	return tuple(ImmutableCategory.from_string(cat) for cat in cats)
+
+class Grammar(english.RandomStateMixin):
+	"""
+	A grammar made of featureized phrasal rules and a lexicon
+	mapping words to featureized categories.
+
+	Symbols are indexed and closed over by their bare category,
+	since features are checked by the chart, not the index.
+
+	The lexicon may be given as a dict, as text in the
+	`english.WORDS` format, or as an on-disk lexicon backend.
+
+	>>> g = make_feature_grammar()
+	>>> g.first['Np'][0]
+	S -> Np(case:subj) Vp {lhs=num,rhs=['num', 'num']} 
+	>>> sorted(g.left_corners['Pp'])
+	['Pp', 'prep']
+	>>> g.lexicon['pigeons']
+	(n(num:pl),)
+
+	The networkx left-corner graph is built, and networkx imported,
+	only when it is first asked for.
+
+	>>> g.left_corner.has_edge(g.grammar[0].lhs, g.grammar[0].rhs[0])
+	True
+
+	The `reachability` graph, which `slice` uses to cut the grammar
+	down to the rules that a sentence can use, is also built when it
+	is first asked for, but from plain dicts, without networkx.
+	"""
+	def __init__(self, rules, lexicon=None, state=None):
+		self.state = state
 		self.grammar = rules
-		self.left_corner = self._make_left_corner()
+		if lexicon is None:
+			lexicon = {}
+		elif isinstance(lexicon, basestring):
+			lexicon = compile_lexicon(lexicon)
+		self.lexicon = english.bind_lexicon(lexicon, lexical_categories)
+		self.first = english.index_rules(self.grammar, self.key)
+		self.expansions = english.index_expansions(self.grammar, self.key)
+		self.symbols = english.symbol_table(self.grammar, self.key)
+		self.left_corners = english.left_corner_closure(self.grammar, self.key)
+
+	@property
+	def left_corner(self):
+		try:
+			return self._left_corner
+		except AttributeError:
+			self._left_corner = self._make_left_corner()
+			return self._left_corner
+
+	@staticmethod
+	def key(category):
+		return category.cat
+
 	def _make_left_corner(self):
+		import networkx as nx
 		g = nx.DiGraph()
 		for r in self.grammar:
 			g.add_edge(r.lhs,r.rhs[0])
 		return nx.freeze(g)
 
+	@property
+	def reachability(self):
+		try:
+			return self._reachability
+		except AttributeError:
+			self._reachability = self._make_reachability()
+			return self._reachability
+
+	def _make_reachability(self):
+		"""
+		The graph that edges are built along, as a pair of dicts over
+		the rules, numbered by their place in the grammar: `uses` maps each
+		bare category to the rules it is a daughter in, and `makes` maps
+		it to the rules it is the left-hand side of. Like the indexes,
+		it is plain dicts, so that neither networkx nor numpy
+		is imported to slice the grammar for a sentence.
+		"""
+		uses = defaultdict(list)
+		makes = defaultdict(list)
+		for i, r in enumerate(self.grammar):
+			for d in set(self.key(d) for d in r.rhs):
+				uses[d].append(i)
+			makes[self.key(r.lhs)].append(i)
+		return dict(uses), dict(makes)
+
+	def slice(self, categories, topcat):
+		"""
+		The part of the grammar that can be used in a parse
+		rooted in `topcat`, given the lexical `categories` of the words:
+		the rules whose daughters can all be built bottom-up from
+		the categories, and that can go on to build `topcat`.
+		Features are ignored, as in the indexes.
+
+		Parameters
+		----------
+		categories: iterable
+			the categories that the lexicon gives the words.
+		topcat: ImmutableCategory or string
+			the category of a sentence.
+
+		Returns
+		-------
+		slice: Grammar
+			a grammar with the same lexicon, and only those rules.
+
+		>>> g = make_feature_grammar()
+		>>> cats = set(c for w in 'the pigeons suffer'.split() for c in g.lexicon[w])
+		>>> s = g.slice(cats, 'S')
+		>>> len(g.grammar), len(s.grammar)
+		(22, 6)
+		>>> for r in s.grammar:
+		...     print r
+		S -> Np(case:subj) Vp {lhs=num,rhs=['num', 'num']} 
+		Np -> det Nn {lhs=num,rhs=['num', 'num']} 
+		Nn -> n {lhs=num,rhs=['num']} 
+		Vp -> v(tr:trans) Np(case:obj) {lhs=num,rhs=['num', '']} 
+		Vp -> v(tr:intrans) {lhs=num,rhs=['num']} 
+		Vp -> v(tr:ditrans) Np Np {lhs=num,rhs=['num', '', '']} 
+
+		The work done depends on the rules that the words
+		can reach, not on the size of the grammar.
+		"""
+		if isinstance(topcat, basestring):
+			topcat = ImmutableCategory.from_string(topcat)
+		uses, makes = self.reachability
+		built = set(self.key(c) for c in categories)
+		waiting = {}
+		todo = list(built)
+		usable = set()
+		while todo:
+			x = todo.pop()
+			for i in uses.get(x, ()):
+				if i not in waiting:
+					waiting[i] = len(set(self.key(d) for d in self.grammar[i].rhs))
+				waiting[i] -= 1
+				if waiting[i] == 0:
+					usable.add(i)
+					lhs = self.key(self.grammar[i].lhs)
+					if lhs not in built:
+						built.add(lhs)
+						todo.append(lhs)
+		keep = set()
+		todo = [self.key(topcat)]
+		seen = set(todo)
+		while todo:
+			x = todo.pop()
+			for i in makes.get(x, ()):
+				if i in usable and i not in keep:
+					keep.add(i)
+					for d in self.grammar[i].rhs:
+						if self.key(d) not in seen:
+							seen.add(self.key(d))
+							todo.append(self.key(d))
+		return Grammar([self.grammar[i] for i in sorted(keep)], self.lexicon, state=self._state)
+
+
+def build_feature_grammar(rules, words):
+	"""
+	Compile a feature grammar from rule text and lexicon text
+	or backend, bypassing the cache.
+	"""
+	return Grammar(compile_grammar(rules), words)
 
 
+def make_feature_grammar(rules=None, words=None):
+	"""
+	Fetch a compiled feature grammar from the process-wide cache,
+	compiling it only the first time that its text is seen.
+	The grammar is shared with other callers; see `english.GrammarCache`.
 
-def make_feature_grammar():
-	return Grammar(list(compile_grammar(english.RULES)) + list(compile_lexicon(english.WORDS)))
+	>>> make_feature_grammar() is make_feature_grammar()
+	True
+	"""
+	return english.GRAMMARS.get('features',
+								english.RULES if rules is None else rules,
+								english.WORDS if words is None else words,
+								build_feature_grammar)
 
 
+def atomic_name(category):
+	"""
+	The name of a category as an atomic symbol: the bare category,
+	followed by its feature values, in alphabetical order.
 
+	>>> atomic_name(ImmutableCategory.from_string('Np(num:pl,case:subj)'))
+	'Np_pl_subj'
+	>>> atomic_name(ImmutableCategory.from_string('det'))
+	'det'
+	"""
+	return '_'.join([category.cat] + sorted(v for _, v in category.features))
 
+
+class NamedLexicon(object):
+	"""
+	A view of a feature lexicon that gives the atomic names of the
+	categories of each word, as `ExpandedGrammar.lexical_names` makes them.
+	"""
+
+	def __init__(self, lexicon, grammar):
+		self.lexicon = lexicon
+		self.grammar = grammar
+
+	def get(self, word, default=None):
+		cats = self.lexicon.get(word)
+		if cats is None:
+			return default
+		return self.grammar.lexical_names(cats)
+
+	def __getitem__(self, word):
+		return self.grammar.lexical_names(self.lexicon[word])
+
+	def __contains__(self, word):
+		return word in self.lexicon
+
+	def __iter__(self):
+		return iter(self.lexicon)
+
+	def __len__(self):
+		return len(self.lexicon)
+
+
+class ExpandedGrammar(english.Grammar):
+	"""
+	A feature grammar compiled into a plain grammar over atomic
+	symbols, one for each category, with its feature values, that the
+	feature chart could build, such as ``Np_pl_subj`` for ``Np(case:subj,num:pl)``.
+
+	The categories are found by running the rules of the feature grammar
+	over categories instead of spans, with the same compatibility checks
+	and the same percolation of reentrant features as the feature chart
+	(see `edges.Edge.percolate`), until no new categories turn up. Each
+	way of completing a rule gives a plain rule. The chart can then use
+	its string labels, and never checks or percolates features.
+
+	The two can disagree where the feature chart takes shortcuts. It
+	drops an edge that is more specific than one it already has, with its
+	analyses, and it finds the partial edges of a tree by compatibility
+	rather than identity, so that it can put together trees whose labels do not
+	follow from their daughters, or lose the daughters of a node whose
+	label was changed by percolation. The expanded grammar does none of these.
+
+	The expanded grammar has a symbol for every combination of feature
+	values that the rules can build, and the chart builds an edge for
+	each, so for a grammar with few features it is no faster: it
+	saves work on each edge, and builds more of them.
+
+	The lexicon is not read in advance, so that an on-disk lexicon stays
+	on disk. The rules are expanded from the categories of the words
+	looked up so far, and expanded again, in place, when a word brings a
+	category that has not been seen before. The chart looks its words up
+	before it parses them, so the rules it needs are there by then. An
+	`chart.IncrementalChart` may miss analyses that combine a category seen
+	only in a later arc with edges that were made earlier.
+
+	`feature_tree` maps trees back to categories with features. Packed
+	forests (`chart.Chart.forest`, and the ``forest`` output of `chart.parse`)
+	keep the atomic symbols, which `categories` maps back.
+
+	Parameters
+	----------
+	grammar: Grammar
+		the feature grammar to expand.
+
+	Attributes
+	----------
+	categories: dict
+		maps each atomic symbol to its category.
+	names: dict
+		maps each category to its atomic symbol.
+
+	Examples
+	--------
+
+	>>> g = build_expanded_grammar(english.RULES, english.WORDS)
+	>>> len(g.grammar)
+	0
+	>>> g.lexicon['they']
+	('pn_pl_subj',)
+	>>> len(g.grammar)
+	1
+	>>> names = [g.lexicon[w] for w in 'the pigeons punished a sheep and stuart suffers'.split()]
+	>>> len(make_feature_grammar().grammar), len(g.grammar)
+	(22, 64)
+	>>> names = [g.lexicon[w] for w in g.source.lexicon]
+	>>> len(g.grammar)
+	327
+	>>> [r for r in g.grammar if r.lhs == 'Nn_pl']
+	[Rule(lhs='Nn_pl', rhs=['adj', 'n_pl']), Rule(lhs='Nn_pl', rhs=['n_pl'])]
+	>>> [r.rhs for r in g.grammar if r.lhs == 'S_pl' and r.rhs[0] == 'Np_pl_subj'][:3]
+	[['Np_pl_subj', 'Vp'], ['Np_pl_subj', 'Vp_pl'], ['Np_pl_subj', 'cop_pl', 'ppart']]
+
+	Parses with the expanded grammar are mapped back to categories
+	with features:
+
+	>>> chart.parse(['the', 'pigeon', 'suffers'], grammar=g, sep='_')
+	['the', 'pigeon', 'suffers']
+	Parse 1:
+	S(num:sing)
+	_Np(num:sing)
+	__det the
+	__Nn(num:sing)
+	___n(num:sing) pigeon
+	_Vp(num:sing)
+	__v(num:sing,tr:intrans) suffers
+	1 parses
+	>>> chart.parse(['the', 'pigeon', 'suffer'], grammar=g)
+	['the', 'pigeon', 'suffer']
+	No parse
+	"""
+
+	def __init__(self, grammar):
+		self._state = grammar._state
+		self.source = grammar
+		self.categories = {}
+		self.names = {}
+		self.grammar = []
+		self.first = {}
+		self.expansions = {}
+		self.lexicon = NamedLexicon(grammar.lexicon, self)
+		self.compile()
+
+	def lexical_names(self, cats):
+		"""
+		The atomic symbols for the categories `cats` of a word. If
+		any of them is new, the rules are expanded again to take it
+		in. The rule list and the indexes that the chart holds on to
+		are updated in place.
+		"""
+		if all(c in self.names for c in cats):
+			return tuple(self.names[c] for c in cats)
+		names = tuple(self.name(c) for c in cats)
+		self.grammar[:] = self._expand(self.source.grammar)
+		first, expansions = self.first, self.expansions
+		self.compile()
+		first.clear()
+		first.update(self.first)
+		expansions.clear()
+		expansions.update(self.expansions)
+		self.first, self.expansions = first, expansions
+		return names
+
+	def name(self, category):
+		"""
+		The atomic symbol for `category`, made up the first time.
+		"""
+		try:
+			return self.names[category]
+		except KeyError:
+			pass
+		n = atomic_name(category)
+		if n in self.categories:
+			n = '_'.join([category.cat] + sorted(':'.join(f) for f in category.features))
+		self.names[category] = n
+		self.categories[n] = category
+		return n
+
+	def _completions(self, rule):
+		"""
+		Generate the ways of completing `rule` with the categories
+		known so far, as pairs of the resulting category and the daughters.
+		"""
+		from edges import Edge
+		by_cat = {}
+		for c in self.names:
+			by_cat.setdefault(c.cat, []).append(c)
+		stack = [(Edge(rule.lhs, 0, 0, rule.rhs, rule.constraints), ())]
+		while stack:
+			e, daughters = stack.pop()
+			if not e.needed:
+				yield e.label, daughters
+				continue
+			need = e.needed[0]
+			for c in by_cat.get(need.cat, ()):
+				if need.fcheck(c):
+					new = Edge(e.label, 0, 0, e.needed[1:], e.constraints).percolate(c)
+					stack.append((new, daughters + (c,)))
+
+	def _expand(self, rules):
+		done = False
+		while not done:
+			done = True
+			for rule in rules:
+				for lhs, _ in self._completions(rule):
+					if lhs not in self.names:
+						self.name(lhs)
+						done = False
+		expanded = set()
+		for rule in rules:
+			for lhs, daughters in self._completions(rule):
+				expanded.add((self.names[lhs], tuple(self.names[c] for c in daughters)))
+		return [english.Rule(lhs=lhs, rhs=list(rhs)) for lhs, rhs in sorted(expanded)]
+
+	def variants(self, category):
+		"""
+		The atomic symbols for the categories compatible with
+		`category`, given as a category or as a string such as ``'S'``.
+		"""
+		if isinstance(category, basestring):
+			category = ImmutableCategory.from_string(category)
+		return frozenset(n for n, c in self.categories.items()
+						 if c.cat == category.cat and category.fcheck(c))
+
+	def feature_tree(self, tree):
+		"""
+		A copy of `tree` with the atomic symbols replaced by
+		their categories. Words, at the leaves, are left as they are,
+		even when they look like a symbol.
+
+		Symbols are only named once the words that need them have
+		been looked up, so the plural noun is mapped after `pigeons` is.
+
+		>>> g = build_expanded_grammar(english.RULES, english.WORDS)
+		>>> t = chart.Tree('n_pl', [chart.Tree('n_pl', ())])
+		>>> print chart.treestring(g.feature_tree(t))
+		n_pl n_pl
+		<BLANKLINE>
+		>>> _ = g.lexicon['pigeons']
+		>>> print chart.treestring(g.feature_tree(t))
+		n(num:pl) n_pl
+		<BLANKLINE>
+		"""
+		stack = [(tree, [])]
+		while True:
+			t, done = stack[-1]
+			if len(done) < len(t.children):
+				stack.append((t.children[len(done)], []))
+				continue
+			stack.pop()
+			r = chart.Tree(self.categories.get(t.parent, t.parent) if t.children else t.parent, done)
+			if not stack:
+				return r
+			stack[-1][1].append(r)
+
+
+def build_expanded_grammar(rules, words):
+	"""
+	Compile and expand a feature grammar, bypassing the cache.
+	"""
+	return ExpandedGrammar(build_feature_grammar(rules, words))
+
+
+def expand_feature_grammar(rules=None, words=None):
+	"""
+	Fetch an expanded feature grammar from the process-wide
+	cache, expanding it only the first time that its text is seen.
+
+	>>> expand_feature_grammar() is expand_feature_grammar()
+	True
+	"""
+	return english.GRAMMARS.get('expanded',
+								english.RULES if rules is None else rules,
+								english.WORDS if words is None else words,
+								build_expanded_grammar)
@@ -0,0 +1,437 @@
+"""
+Packed parse forests
+====================
+
+A chart represents an exponential number of trees in polynomial
+space, but `Chart.trees` can only get them out one at a time. A
+`Forest` is the part of the chart that is reachable from the
+solutions, in array-backed tables whose size is linear in the number
+of chart edges, so that downstream code can run dynamic programs over
+all the parses without enumerating them.
+
+Nodes and hyperedges
+--------------------
+
+Each node is a chart edge, described by ``(label, left, right)``.
+Complete edges are constituents. Partial edges are the intermediate
+nodes of a binarized rule application: they are kept so that the
+forest stays linear in the size of the chart, rather than
+multiplying out the split points of long rules. Their `needed`
+field says what they are still waiting for. The words of the input
+are leaf nodes.
+
+Each hyperedge is a tuple of child node ids:
+
+	- ``(p, c)`` when the partial node `p` was extended by the complete node `c`.
+	- ``(c,)`` when `c` is the first daughter of a rule, or a preterminal's word.
+
+A node with no hyperedges is a leaf. The daughters of a
+complete node are found by following partial children leftward.
+
+Nodes are numbered so that children come before their parents
+whenever the forest is acyclic, so a single pass over the node ids
+is a bottom-up pass.
+
+Examples
+--------
+
+>>> import chart
+>>> v = chart.parse('the pigeons suffer'.split(), return_chart=True, print_trees=False)
+>>> f = v.forest()
+>>> [f.node(i) for i in f.roots]
+[('S', 0, 3)]
+>>> f.hyperedges(f.roots[0])
+[(7, 10)]
+>>> f.node(7), f.needed(7)
+(('S', 0, 2), ('Vp',))
+>>> f.hyperedges(7)
+[(6,)]
+>>> f.node(6), f.hyperedges(6)
+(('Np', 0, 2), [(2, 5)])
+>>> f.node(2), f.needed(2), f.hyperedges(2)
+(('Np', 0, 1), ('Nn',), [(1,)])
+>>> f.node(1), f.hyperedges(1), f.node(0), f.hyperedges(0)
+(('det', 0, 1), [(0,)], ('the', 0, 1), [])
+>>> len(f), f.n_hyperedges
+(12, 9)
+
+The forest for 'and they suffer' repeated 40 times stands for more
+than 10^20 trees, but is no bigger than the chart:
+
+>>> v = chart.parse(('the pigeons are punished' + ' and they suffer' * 40).split(),
+...                 return_chart=True, print_trees=False)
+>>> f = v.forest()
+>>> len(f), f.n_hyperedges
+(2874, 13410)
+"""
+
+##
+# license: Apache 2.0
+##
+
+from array import array
+from math import exp, log
+
+INFINITE = float('inf')
+
+
+def logadd(x, y):
+	"""
+	Add two numbers that are given as natural logarithms.
+
+	>>> round(exp(logadd(log(2), log(3))), 6)
+	5.0
+	"""
+	if x < y:
+		x, y = y, x
+	if y == -INFINITE or x == INFINITE:
+		return x
+	return x + log(1.0 + exp(y - x))
+
+
+def random_below(state, n):
+	"""
+	Draw an integer uniformly from ``range(n)``, however big `n` is,
+	using the numpy random `state`, 32 bits at a time, by rejection.
+	"""
+	bits = n.bit_length()
+	chunks = (bits + 31) // 32
+	while True:
+		k = 0
+		for _ in xrange(chunks):
+			k = (k << 32) | int(state.randint(0, 1 << 32))
+		k >>= 32 * chunks - bits
+		if k < n:
+			return k
+
+
+class Forest(object):
+
+	"""
+	A packed forest, in array-backed tables.
+
+	Attributes
+	----------
+	symbols: list
+		the distinct labels, indexed by label id.
+	labels, lefts, rights: array of int
+		the label id and span of each node.
+	roots: list of int
+		the nodes for the solutions.
+	cyclic: set of int
+		the nodes that are their own descendants, as happens
+		with cyclic lattices. These have infinitely many trees.
+	dead: set of int
+		the nodes for edges that were built, but none of whose
+		derivations can be rebuilt from the chart. These have no trees.
+	"""
+
+	def __init__(self):
+		self.symbols = []
+		self._symbol_ids = {}
+		self.labels = array('i')
+		self.lefts = array('i')
+		self.rights = array('i')
+		self._needed = {}
+		self.edge_starts = array('i', [0])
+		self.child_starts = array('i', [0])
+		self.children = array('i')
+		self.roots = []
+		self.cyclic = set()
+		self.dead = set()
+
+	def __len__(self):
+		return len(self.labels)
+
+	@property
+	def acyclic(self):
+		return not self.cyclic
+
+	@property
+	def n_hyperedges(self):
+		return len(self.child_starts) - 1
+
+	def add_node(self, label, left, right, needed=()):
+		"""
+		Add a node, with hyperedges to come. Return its id.
+		"""
+		try:
+			lid = self._symbol_ids[label]
+		except KeyError:
+			lid = self._symbol_ids[label] = len(self.symbols)
+			self.symbols.append(label)
+		i = len(self.labels)
+		self.labels.append(lid)
+		self.lefts.append(left)
+		self.rights.append(right)
+		if needed:
+			self._needed[i] = tuple(needed)
+		return i
+
+	def add_hyperedges(self, hyperedges):
+		"""
+		Add the hyperedges of the most recently added node
+		whose hyperedges have not yet been added.
+		"""
+		for children in hyperedges:
+			self.children.extend(children)
+			self.child_starts.append(len(self.children))
+		self.edge_starts.append(len(self.child_starts) - 1)
+
+	def node(self, i):
+		"""
+		Return ``(label, left, right)`` for node `i`.
+		"""
+		return self.symbols[self.labels[i]], self.lefts[i], self.rights[i]
+
+	def needed(self, i):
+		"""
+		What node `i` still needs: empty for complete nodes.
+		"""
+		return self._needed.get(i, ())
+
+	def is_complete(self, i):
+		return i not in self._needed
+
+	def edge_range(self, i):
+		"""
+		The ids of the hyperedges of node `i`.
+		"""
+		return xrange(self.edge_starts[i], self.edge_starts[i + 1])
+
+	def hyperedge(self, h):
+		"""
+		The children of hyperedge `h`.
+		"""
+		return tuple(self.children[self.child_starts[h]:self.child_starts[h + 1]])
+
+	def hyperedges(self, i):
+		"""
+		The children tuples of each hyperedge of node `i`.
+		"""
+		return [self.hyperedge(h) for h in self.edge_range(i)]
+
+	def counts(self, log=False):
+		"""
+		The number of trees rooted in each node, in a single
+		bottom-up pass over the node ids, with no recursion.
+
+		Parameters
+		----------
+		log: boolean
+			if true, return natural logarithms as floats, instead of
+			exact integers. This is faster when the counts are huge.
+
+		Returns
+		-------
+		counts: list
+			indexed by node id. Nodes with infinitely many trees
+			get `INFINITE` (in either mode).
+		"""
+		one = 0.0 if log else 1
+		r = [one] * len(self)
+		for i in xrange(len(self)):
+			if i in self.cyclic:
+				r[i] = INFINITE
+				continue
+			if i in self.dead:
+				r[i] = -INFINITE if log else 0
+				continue
+			hs = self.edge_range(i)
+			if not hs:
+				continue
+			total = None
+			for h in hs:
+				children = self.hyperedge(h)
+				if log:
+					prod = sum(r[c] for c in children)
+					total = prod if total is None else logadd(total, prod)
+				else:
+					prod = 1
+					for c in children:
+						prod *= r[c]
+					total = prod if total is None else total + prod
+			r[i] = total
+		return r
+
+	def daughters(self, i, k, counts):
+		"""
+		Choose the derivation of node `i` with rank `k`, and return its
+		daughters, left to right, as ``(node, rank)`` pairs. Derivations
+		are ranked in hyperedge order, and the ranks of a partial and its
+		extension vary fastest on the right, as `Chart.trees` enumerates them.
+		"""
+		ds = []
+		while True:
+			cs = ()
+			for h in self.edge_range(i):
+				cs = self.hyperedge(h)
+				n = 1
+				for c in cs:
+					n *= counts[c]
+				if k < n:
+					break
+				k -= n
+			if len(cs) == 2:
+				p, c = cs
+				k, kc = divmod(k, counts[c])
+				ds.append((c, kc))
+				i = p
+			else:
+				ds.extend((c, k) for c in cs)
+				break
+		ds.reverse()
+		return ds
+
+	def tree_at(self, i, k, build, counts=None, memo=None):
+		"""
+		Build the tree of node `i` with rank `k` directly, without
+		enumerating the trees before it, in time proportional to its size.
+
+		Parameters
+		----------
+		i: int
+			the root node.
+		k: int
+			the rank of the tree, from 0.
+		build: function
+			called as ``build(label, children)`` to make each subtree.
+		counts: list
+			the result of `counts`, if already known.
+		memo: dict
+			subtrees already built, by ``(node, rank)``. Subtrees found
+			here are shared, not rebuilt, and new ones are added.
+		"""
+		if counts is None:
+			counts = self.counts()
+		if memo is None:
+			memo = {}
+		if counts[i] == INFINITE:
+			raise ValueError("node %d has infinitely many trees" % i)
+		if not 0 <= k < counts[i]:
+			raise IndexError(k)
+		if (i, k) in memo:
+			return memo[i, k]
+		stack = [(i, k, self.daughters(i, k, counts)[::-1], [])]
+		while True:
+			j, kj, todo, done = stack[-1]
+			if todo:
+				d = todo.pop()
+				if d in memo:
+					done.append(memo[d])
+				else:
+					stack.append((d[0], d[1], self.daughters(d[0], d[1], counts)[::-1], []))
+			else:
+				stack.pop()
+				t = memo[j, kj] = build(self.symbols[self.labels[j]], done)
+				if not stack:
+					return t
+				stack[-1][3].append(t)
+
+	def sample(self, i, n, state, build, counts=None):
+		"""
+		Generate `n` trees of node `i`, drawn uniformly at random
+		and independently, by unranking uniformly drawn ranks.
+		Each tree costs time linear in its size.
+		"""
+		if counts is None:
+			counts = self.counts()
+		if counts[i] == INFINITE:
+			raise ValueError("node %d has infinitely many trees" % i)
+		for _ in xrange(n):
+			yield self.tree_at(i, random_below(state, counts[i]), build, counts)
+
+	def count(self, log=False):
+		"""
+		The total number of trees rooted in the roots.
+
+		>>> import chart, lattice
+		>>> v = chart.parse(('the pigeons are punished' + ' and they suffer' * 5).split(),
+		...                 return_chart=True, print_trees=False)
+		>>> v.forest().count()
+		42
+		>>> round(exp(v.forest().count(log=True)), 6)
+		42.0
+		>>> v = chart.parse(lattice.demo_arcs2, input_source=lattice.DemoLatticeWords,
+		...                 return_chart=True, print_trees=False)
+		>>> v.forest().count()
+		inf
+		"""
+		counts = self.counts(log=log)
+		if log:
+			return reduce(logadd, (counts[r] for r in self.roots), -INFINITE)
+		return sum(counts[r] for r in self.roots)
+
+
+def from_chart(chart, roots):
+	"""
+	Build the forest of `chart` reachable from the edges `roots`.
+
+	Nodes are numbered in post-order by an iterative depth-first
+	walk over the derivations, so there is no recursion limit.
+	Every node on a cycle found by the walk is marked as cyclic.
+
+	Only words, and other edges with no recorded predecessors, are
+	leaves. An edge that has predecessors, but whose derivations all
+	fail to be rebuilt or all use such edges, is marked as dead, with
+	no hyperedges, so that it has no trees rather than being taken for a
+	word. In this sentence, a plural ``S`` is built on the final ``Np``,
+	but never from a partial edge that the chart holds:
+
+	>>> import chart
+	>>> v = chart.parse('the pigeon is punished by them'.split(), use_features=True, return_chart=True)
+	['the', 'pigeon', 'is', 'punished', 'by', 'them']
+	No parse
+	>>> f = v.forest()
+	>>> len(f.roots), f.count(), f.dead == set(f.roots)
+	(1, 0, True)
+	"""
+	f = Forest()
+	ids = {}
+	order = []
+	derivations = {}
+	on_stack = {}
+	cyclic = set()
+	dead = set()
+
+	def daughters(e):
+		ds = derivations[e] = chart.derivations(e)
+		for p, c in ds:
+			if p is not None and not chart.is_empty(p):
+				yield p
+			yield c
+
+	for root in roots:
+		if root in ids:
+			continue
+		on_stack[root] = 0
+		stack = [(root, daughters(root))]
+		while stack:
+			e, pending = stack[-1]
+			for d in pending:
+				if d in ids:
+					continue
+				if d in on_stack:
+					cyclic.update(x for x, _ in stack[on_stack[d]:])
+					continue
+				on_stack[d] = len(stack)
+				stack.append((d, daughters(d)))
+				break
+			else:
+				stack.pop()
+				del on_stack[e]
+				ids[e] = len(order)
+				order.append(e)
+
+	for e in order:
+		f.add_node(e.label, e.left, e.right, e.needed)
+		hyperedges = [(c,) if p is None or chart.is_empty(p) else (p, c)
+					  for p, c in derivations[e]]
+		hyperedges = [h for h in hyperedges if not dead.intersection(h)]
+		if not hyperedges and chart.prev.get(e):
+			dead.add(e)
+		f.add_hyperedges(tuple(ids[d] for d in h) for h in hyperedges)
+	f.roots = [ids[r] for r in roots]
+	f.cyclic = set(ids[e] for e in cyclic)
+	f.dead = set(ids[e] for e in dead)
+	return f
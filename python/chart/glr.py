@@ -0,0 +1,466 @@
+"""
+Generalized LR parsing
+======================
+
+A chart parser tries every rule wherever its first daughter turns
+up. An LR parser compiles the grammar into a finite automaton over the
+items of the rules instead, so that it only builds what could continue
+what is already on its stack, and does so deterministically wherever
+the grammar lets it. Generalized LR (Tomita) parsing keeps every stack
+that the input allows, sharing their common parts in a graph-structured
+stack, so that it handles ambiguous grammars too, and stays close to
+linear on inputs that are mostly unambiguous.
+
+The tables are those of the LR(0) automaton of the grammar, with
+LALR(1) lookaheads on the reductions, and are compiled once for each
+grammar and top category and kept with the grammar (see `get_tables`).
+Grammars with features are not handled: their rules have to be
+expanded into plain ones first, as `features.ExpandedGrammar` does.
+The solutions are then those of any of the symbols that stand for
+the top category.
+
+Words are looked up in the lexicon as usual, and their categories
+are the terminal symbols of the automaton. A category can also be
+the left-hand side of rules, so every symbol counts as its own first
+symbol.
+
+`GLRChart` runs the parser and records what it finds in the tables
+of a `chart.Chart`, as the fundamental rule would, so `solutions`,
+`trees`, `forest` and the rest work as before and give the same
+parses.
+
+Examples
+--------
+
+>>> import chart
+>>> words = 'steve hit the boy in the house in the room on the computer in the cage'.split()
+>>> v = GLRChart(words)
+>>> v.solutions('S')
+[C(S, 0, 16)]
+>>> v.forest('S').count(), chart.Chart(words).forest('S').count()
+(42, 42)
+
+On a grammar for lists of commands, which is unambiguous apart from
+the words, the GLR parser works in time linear in the length of
+the input, while a chart builds a list of commands from every ``and``,
+whatever went before:
+
+>>> commands = english.Grammar('''Cmds -> Cmd | Cmd conj Cmds
+... Cmd -> v Np | v Np Np | v Np Pp
+... Np -> det n | pn | det adj n
+... Pp -> prep Np''', english.WORDS)
+>>> get_tables(commands, 'Cmds').conflicts
+0
+>>> def size(ch):
+...     return sum(chart.edge_summary(ch).values())
+>>> for k in 10, 20, 40:
+...     words = ' and '.join(['show me a movie', 'cage the rats in the room'] * k).split()
+...     g = GLRChart(words, grammar=commands, topcat='Cmds')
+...     print len(words), size(chart.Chart(words, grammar=commands)), size(g), g.stack_nodes, len(g.solutions('Cmds'))
+119 1167 546 192 1
+239 3137 1096 382 1
+479 9477 2196 762 1
+"""
+
+##
+# license: Apache 2.0
+##
+
+from collections import defaultdict
+
+import chart
+import english
+from edges import Edge
+
+START = "S'"
+END = '$'
+PROPAGATE = '#'
+
+
+def check_plain(grammar):
+	"""
+	Raise a ValueError unless `grammar` is without features.
+	"""
+	for r in grammar.grammar:
+		if r.constraints is not None or not isinstance(r.lhs, basestring):
+			raise ValueError("LR tables need a grammar without features")
+
+
+class LRTables(object):
+
+	"""
+	LALR(1) tables for a plain grammar.
+
+	The states are those of the LR(0) automaton: sets of items
+	``(rule, dot)``, identified by their kernels. The first rules are
+	the augmented rules ``S' -> topcat``: one, or, for a grammar with
+	`variants`, one for each symbol that stands for `topcat`. The lookaheads
+	of the reductions are found by the propagation method of Aho, Sethi and Ullman.
+
+	Parameters
+	----------
+	grammar: english.Grammar
+		the grammar, without features.
+	topcat: string
+		the category of the solutions.
+
+	Attributes
+	----------
+	rules: list of ``(lhs, rhs)``
+		the rules, with `rhs` a tuple.
+	n_starts: integer
+		the number of augmented rules, which come first in `rules`.
+	goto: list of dict
+		for each state, the state reached on each symbol. Shifting
+		a word's category and going to a state after a reduction
+		use the same table.
+	reduce: list of dict
+		for each state, the rules that it can reduce by with each
+		lookahead symbol, ``$`` being the end of the input.
+	conflicts: integer
+		the number of ``(state, lookahead)`` pairs with more than one
+		action: where the parser has to split its stack.
+
+	Examples
+	--------
+
+	>>> t = get_tables(english.get_grammar(), 'S')
+	>>> len(t.goto), t.conflicts
+	(32, 35)
+	>>> t.rules[t.reduce[t.goto[0]['pn']]['v'][0]]
+	('Np', ('pn',))
+	"""
+
+	def __init__(self, grammar, topcat):
+		check_plain(grammar)
+		self.topcat = topcat
+		tops = sorted(grammar.variants(topcat)) if hasattr(grammar, 'variants') else [topcat]
+		self.n_starts = len(tops)
+		self.rules = [(START, (t,)) for t in tops] + [(r.lhs, tuple(r.rhs)) for r in grammar.grammar]
+		by_lhs = defaultdict(list)
+		for k, (lhs, _) in enumerate(self.rules):
+			by_lhs[lhs].append(k)
+		left_corners = english.left_corner_closure([english.Rule(lhs, rhs) for lhs, rhs in self.rules],
+												   english.Grammar.key)
+		self.first = dict((x, left_corners.get(x, frozenset([x])))
+						  for _, rhs in self.rules for x in rhs)
+		self.predicts = dict((x, tuple(k for y in self.first[x] for k in by_lhs.get(y, ())))
+							 for x in self.first)
+		self.by_lhs = dict(by_lhs)
+		self._automaton()
+		self._lookaheads()
+
+	def closure(self, kernel):
+		"""
+		The LR(0) items of the state with `kernel`.
+		"""
+		items = set(kernel)
+		for r, d in kernel:
+			rhs = self.rules[r][1]
+			if d < len(rhs):
+				items.update((k, 0) for k in self.predicts[rhs[d]])
+		return items
+
+	def _automaton(self):
+		start = frozenset((k, 0) for k in range(self.n_starts))
+		self.kernels = [start]
+		self.goto = []
+		index = {start: 0}
+		i = 0
+		while i < len(self.kernels):
+			moves = defaultdict(set)
+			for r, d in self.closure(self.kernels[i]):
+				rhs = self.rules[r][1]
+				if d < len(rhs):
+					moves[rhs[d]].add((r, d + 1))
+			row = {}
+			for x, kernel in moves.items():
+				kernel = frozenset(kernel)
+				if kernel not in index:
+					index[kernel] = len(self.kernels)
+					self.kernels.append(kernel)
+				row[x] = index[kernel]
+			self.goto.append(row)
+			i += 1
+
+	def _closure1(self, item):
+		"""
+		The LR(1) closure of the kernel `item` with the dummy
+		lookahead ``#``, as a dict from items to lookaheads.
+		"""
+		las = defaultdict(set)
+		las[item].add(PROPAGATE)
+		todo = [item]
+		while todo:
+			r, d = todo.pop()
+			rhs = self.rules[r][1]
+			if d < len(rhs) and rhs[d] in self.by_lhs:
+				new = self.first[rhs[d + 1]] if d + 1 < len(rhs) else las[r, d]
+				for k in self.by_lhs[rhs[d]]:
+					if not new <= las[k, 0]:
+						las[k, 0] |= new
+						todo.append((k, 0))
+		return las
+
+	def _lookaheads(self):
+		lookahead = defaultdict(set)
+		for k in range(self.n_starts):
+			lookahead[0, (k, 0)].add(END)
+		propagate = defaultdict(list)
+		for i, kernel in enumerate(self.kernels):
+			for item in kernel:
+				for (r, d), las in self._closure1(item).items():
+					rhs = self.rules[r][1]
+					if d == len(rhs):
+						continue
+					target = self.goto[i][rhs[d]], (r, d + 1)
+					for la in las:
+						if la == PROPAGATE:
+							propagate[i, item].append(target)
+						else:
+							lookahead[target].add(la)
+		changed = True
+		while changed:
+			changed = False
+			for source, targets in propagate.items():
+				for t in targets:
+					if not lookahead[source] <= lookahead[t]:
+						lookahead[t] |= lookahead[source]
+						changed = True
+		self.reduce = [defaultdict(list) for _ in self.kernels]
+		for i, kernel in enumerate(self.kernels):
+			for r, d in kernel:
+				if r >= self.n_starts and d == len(self.rules[r][1]):
+					for la in lookahead[i, (r, d)]:
+						self.reduce[i][la].append(r)
+		self.reduce = [dict((la, tuple(rs)) for la, rs in row.items()) for row in self.reduce]
+		self.conflicts = sum(1 for i, row in enumerate(self.reduce) for la, rs in row.items()
+							 if len(rs) > 1 or la in self.goto[i])
+
+	def reductions(self, state, lookaheads):
+		"""
+		The rules that `state` reduces by, given that any
+		of the symbols `lookaheads` may come next.
+		"""
+		row = self.reduce[state]
+		if len(lookaheads) == 1:
+			for la in lookaheads:
+				return row.get(la, ())
+		return set(r for la in lookaheads for r in row.get(la, ()))
+
+
+def get_tables(grammar, topcat):
+	"""
+	Return the `LRTables` for `grammar` and `topcat`,
+	compiling them the first time, and keeping them with the grammar.
+	An expanded grammar (see `features.ExpandedGrammar`) gains rules as
+	its words are looked up, so the tables are compiled again when
+	the number of rules has changed.
+
+	>>> import features
+	>>> g = features.build_expanded_grammar(english.RULES, english.WORDS)
+	>>> t = get_tables(g, 'S')
+	>>> _ = g.lexicon['they']
+	>>> get_tables(g, 'S') is t, len(get_tables(g, 'S').rules) > len(t.rules)
+	(False, True)
+
+	>>> g = english.get_grammar()
+	>>> get_tables(g, 'S') is get_tables(g, 'S')
+	True
+	"""
+	try:
+		cache = grammar._lr_tables
+	except AttributeError:
+		cache = grammar._lr_tables = {}
+	n = len(grammar.grammar)
+	if topcat not in cache or cache[topcat][0] != n:
+		cache[topcat] = n, LRTables(grammar, topcat)
+	return cache[topcat][1]
+
+
+class StackNode(object):
+
+	"""
+	A node of the graph-structured stack: an automaton state
+	reached at an input state. Each link goes back to the node below,
+	through the complete chart edge that was shifted or reduced to.
+	"""
+
+	__slots__ = ('state', 'position', 'links')
+
+	def __init__(self, state, position):
+		self.state = state
+		self.position = position
+		self.links = {}
+
+
+class GLRChart(chart.Chart):
+
+	"""
+	A chart filled in by a generalized LR parser.
+
+	The input states are visited in order. At each one, the parser
+	first makes every reduction that the lookahead allows, and then
+	shifts the categories of the words that start there. When a reduction
+	adds a link to a stack node that already exists, only the paths
+	through the new link are reduced again: with no empty rules,
+	every other path was reduced when it was made.
+
+	Parameters
+	----------
+	words: list of string
+		the words, or a lattice, as for `chart.Chart`. The arcs of a
+		lattice must go from lower to higher states.
+	grammar: english.Grammar
+		a grammar without features, such as a `features.ExpandedGrammar`.
+		By default, the English grammar. The tables are fetched once
+		the words have been looked up, so that an expanded grammar has
+		the rules for them.
+	topcat: string
+		the category of the solutions.
+
+	Attributes
+	----------
+	tables: LRTables
+		the tables used.
+	stack_nodes, stack_links: integer
+		the size of the graph-structured stack.
+
+	Examples
+	--------
+
+	>>> import lattice
+	>>> nbest = lattice.NBestWords(lattice.demo_nbest)
+	>>> v = GLRChart(nbest)
+	>>> v.solutions('S'), nbest.parsed(v, 'S')
+	([C(S, 0, 7)], [0, 1, 3, 4])
+
+	The solutions are of `topcat`, which need not be ``S``:
+
+	>>> v = GLRChart('show me a movie'.split(), topcat='SImp')
+	>>> v.topcat, v.forest().count(), v.results()['n_trees']
+	('SImp', 1, 1)
+
+	Cyclic lattices, and grammars with features, are not handled:
+
+	>>> GLRChart(lattice.demo_arcs2, input_source=lattice.DemoLatticeWords)
+	Traceback (most recent call last):
+	...
+	ValueError: GLR parsing needs arcs that go from lower to higher states
+	>>> import features
+	>>> GLRChart(['they'], grammar=features.make_feature_grammar())
+	Traceback (most recent call last):
+	...
+	ValueError: LR tables need a grammar without features
+	"""
+
+	def __init__(self, words, grammar=None, topcat='S', verbose=False, input_source=chart.LinearWords):
+		if grammar is None:
+			grammar = english.get_grammar()
+		check_plain(grammar)
+		chart.Chart.__init__(self, words, grammar=grammar, verbose=verbose, input_source=input_source,
+							 topcat=topcat, run=False)
+		self.tables = get_tables(grammar, topcat)
+		self.run()
+
+	def seed_agenda(self, words):
+		words = self.setup_words(words)
+		final_state = words.final_state
+		self.partials = [set() for _ in range(final_state + 1)]
+		self.completes = [set() for _ in range(final_state + 1)]
+		self.lexical_edges = set()
+		self.arc_weights = None
+		self.start_state = getattr(words, 'start_state', 0)
+		self.final_states = frozenset(getattr(words, 'final_states', (final_state,)))
+		self.leaving = defaultdict(list)
+		for i, w, j in words.arcs():
+			if j <= i:
+				raise ValueError("GLR parsing needs arcs that go from lower to higher states")
+			word = self.lexical(i, w, j)
+			self.lexical_edges.add(word)
+			self.completes[i].add(word)
+			for cat in self.lexicon.get(self.key(w), ()):
+				pre = Edge(label=cat, left=i, right=j, needed=(), constraints=None)
+				self.completes[i].add(pre)
+				self.add_prev(pre, word)
+				self.leaving[i].append(pre)
+
+	def run(self):
+		t = self.tables
+		self.stack_nodes = 1
+		self.stack_links = 0
+		frontier = defaultdict(dict)
+		frontier[self.start_state][0] = StackNode(0, self.start_state)
+		for i in xrange(len(self.completes)):
+			if i not in frontier:
+				continue
+			nodes = frontier.pop(i)
+			lookaheads = set(pre.label for pre in self.leaving[i])
+			if i in self.final_states:
+				lookaheads.add(END)
+			todo = [(x, link) for x in nodes.values() for link in x.links]
+			while todo:
+				x, link = todo.pop()
+				for r in t.reductions(x.state, lookaheads):
+					for below, daughters in self.paths(x, link, len(t.rules[r][1])):
+						lhs = t.rules[r][0]
+						e = self.record(lhs, t.rules[r][1], daughters)
+						target = t.goto[below.state].get(lhs)
+						if target is None:
+							continue
+						y = nodes.get(target)
+						if y is None:
+							y = nodes[target] = StackNode(target, i)
+							self.stack_nodes += 1
+						if below not in y.links:
+							y.links[below] = e
+							self.stack_links += 1
+							todo.append((y, below))
+			for pre in self.leaving[i]:
+				for x in nodes.values():
+					target = t.goto[x.state].get(pre.label)
+					if target is not None:
+						ahead = frontier[pre.right]
+						y = ahead.get(target)
+						if y is None:
+							y = ahead[target] = StackNode(target, pre.right)
+							self.stack_nodes += 1
+						if x not in y.links:
+							y.links[x] = pre
+							self.stack_links += 1
+
+	def paths(self, x, link, length):
+		"""
+		Generate the paths of `length` links down the stack from `x`
+		that start with the link to `link`, as pairs of the node at the
+		bottom and the edges passed on the way, left to right.
+		"""
+		stack = [(link, 1, (x.links[link],))]
+		while stack:
+			node, n, daughters = stack.pop()
+			if n == length:
+				yield node, daughters[::-1]
+			else:
+				for below, e in node.links.items():
+					stack.append((below, n + 1, daughters + (e,)))
+
+	def record(self, lhs, rhs, daughters):
+		"""
+		Add the complete edge for `lhs` over `daughters` to the
+		chart, with the partial edges and predecessors that the
+		fundamental rule would have recorded for it, and return it.
+		"""
+		left = daughters[0].left
+		p = Edge(label=lhs, left=left, right=left, needed=rhs, constraints=None)
+		if p not in self.prev:
+			self.prev[p] = set()
+			self.partials[left].add(p)
+			self.changes += 1
+		for k, c in enumerate(daughters):
+			e = Edge(label=lhs, left=left, right=c.right, needed=rhs[k + 1:], constraints=None)
+			self.add_prev(e, c)
+			if e.needed:
+				self.partials[e.right].add(e)
+			else:
+				self.completes[left].add(e)
+		return e
@@ -111,8 +111,42 @@ combine.
 
 The termination condition, also changes slightly: we now say that an analysis is complete if an item is built whose start point
 is a start state of the finite-state machine and whose end point is an accepting state of the machine.
+
+
+Weighted Lattices
+-----------------
+
+The lattices that come out of a recognizer also carry a score on each arc, combining
+the acoustic and language-model evidence for the word, and most of their arcs are very
+unlikely. `WeightedLatticeWords` keeps these scores, as natural logarithms. A scored
+chart, such as `chart.ViterbiChart`, adds the score of each word to the scores of the
+edges built over it, so that the best analysis picks out the best-scoring grammatical
+path through the lattice. Arcs with a low posterior probability can be pruned before
+the chart is seeded.
+
+
+General Lattices
+----------------
+
+`FiniteStateWords` takes a lattice with any state names, such as the ``6.1`` and ``9.2``
+above, and any number of final states, and does the renumbering itself, in topological
+order. Arcs with no word are removed first. `read_slf` reads a lattice in HTK's Standard
+Lattice Format, one line at a time.
+
+Recognizer lattices are often redundant, with several paths for the same words, and
+every extra state is an extra chart cell. `optimize_lattice` trims states that are on
+no complete path, determinizes the lattice over its words, merges states with the same
+futures or the same pasts, and renumbers what is left.
+
+`NBestWords` folds an n-best list into a lattice in the same way, so that a single chart
+parses every hypothesis, and maps each solution back to the hypotheses it covers.
 """
 
+from collections import OrderedDict, defaultdict, deque
+from math import exp, log
+
+from forest import INFINITE, logadd
+
 def arcify(s):
 	i,w,j = s.split()
 	return int(i),w,int(j)
@@ -208,3 +242,770 @@ class DemoLatticeWords(object):
 
 
 
+
+
+
+class WeightedLatticeWords(object):
+
+	"""
+	A lattice whose arcs carry scores.
+
+	The states are numbered from 0, the start state, and the final
+	state is the highest. To find posteriors, every arc must go from a
+	lower state to a higher one, as it does once `FiniteStateWords`
+	has renumbered the states.
+
+	Parameters
+	----------
+	arcs: list of tuple
+		``(i, word, j, score)``, where `score` is the natural log of the
+		weight of the arc, such as an acoustic log-likelihood plus a
+		scaled language-model log-probability. Of two arcs with the
+		same word and states, the better is kept. For best-first
+		parsing (`chart.ViterbiChart`, `chart.AStarChart`) the scores
+		must be at most 0, or the best parse would not come first; those
+		charts raise ValueError for a positive score.
+	threshold: float, optional
+		if given, drop the arcs whose posterior log-probability
+		(see `posteriors`) is below it.
+
+	Attributes
+	----------
+	weights: dict
+		the score of each arc, keyed by ``(i, word, j)``.
+	pruned: integer
+		the number of arcs dropped by the threshold.
+
+	Examples
+	--------
+
+	>>> import chart
+	>>> lat = WeightedLatticeWords(demo_weighted_arcs)
+	>>> v = chart.ViterbiChart(lat, input_source=WeightedLatticeWords)
+	>>> v.best_path()
+	[(0, 'the', 1), (1, 'pigeons', 2), (2, 'are', 3), (3, 'punished', 4)]
+	>>> round(v.logprob, 6)
+	-11.740876
+
+	The path with the best arc scores is not grammatical, and
+	the parse picks the next best that is. Posterior pruning drops
+	the arcs that few paths go through, before the chart sees them:
+
+	>>> [(a, round(exp(p), 3)) for a, p in sorted(lat.posteriors().items())][:5]
+	[((0, 'a', 1), 0.142), ((0, 'the', 1), 0.858), ((1, 'pidgin', 2), 0.402), ((1, 'pigeon', 2), 0.269), ((1, 'pigeons', 2), 0.329)]
+	>>> lat = WeightedLatticeWords(demo_weighted_arcs, threshold=log(0.2))
+	>>> lat.pruned, lat.arcs()
+	(2, [(0, 'the', 1), (1, 'pidgin', 2), (1, 'pigeon', 2), (1, 'pigeons', 2), (2, 'are', 3), (2, 'is', 3), (3, 'punished', 4)])
+	>>> chart.ViterbiChart(lat, input_source=WeightedLatticeWords).best_path()
+	[(0, 'the', 1), (1, 'pigeons', 2), (2, 'are', 3), (3, 'punished', 4)]
+	"""
+
+	start_state = 0
+
+	def __init__(self, arcs, threshold=None):
+		self.weights = {}
+		for i, w, j, score in arcs:
+			key = i, w, j
+			if score > self.weights.get(key, -INFINITE):
+				self.weights[key] = score
+		self.pruned = 0
+		if threshold is not None:
+			posteriors = self.posteriors()
+			for key, p in posteriors.items():
+				if p < threshold:
+					del self.weights[key]
+					self.pruned += 1
+
+	def arcs(self):
+		return sorted(self.weights)
+
+	@property
+	def final_state(self):
+		return max(j for _, _, j in self.weights) if self.weights else 0
+
+	@property
+	def final_states(self):
+		return (self.final_state,)
+
+	def posteriors(self):
+		"""
+		The posterior log-probability of each arc: the share of the
+		total weight of the paths from the start state to a final state
+		that go through it, found by the forward-backward algorithm.
+		"""
+		forward = defaultdict(lambda: -INFINITE)
+		backward = defaultdict(lambda: -INFINITE)
+		forward[self.start_state] = 0.0
+		for f in self.final_states:
+			backward[f] = 0.0
+		arcs = self.arcs()
+		for i, w, j in arcs:
+			if not i < j:
+				raise ValueError("arc (%s, %r, %s) does not go forward" % (i, w, j))
+			forward[j] = logadd(forward[j], forward[i] + self.weights[i, w, j])
+		for i, w, j in reversed(arcs):
+			backward[i] = logadd(backward[i], self.weights[i, w, j] + backward[j])
+		total = backward[self.start_state]
+		return dict(((i, w, j), forward[i] + self.weights[i, w, j] + backward[j] - total)
+					for i, w, j in arcs)
+
+
+##
+# a weighted lattice, with the scores of a recognizer that
+# prefers some words that the grammar does not know
+##
+
+demo_weighted_arcs = [
+	(0, 'the', 1, -0.2),
+	(0, 'a', 1, -2.0),
+	(1, 'pigeons', 2, -0.7),
+	(1, 'pigeon', 2, -0.9),
+	(1, 'pidgin', 2, -0.5),
+	(2, 'are', 3, -0.4),
+	(2, 'is', 3, -1.2),
+	(3, 'punished', 4, -0.3),
+	(3, 'punish', 4, -2.5),
+]
+
+
+class FiniteStateWords(WeightedLatticeWords):
+
+	"""
+	A finite-state machine over words, as input to a chart.
+
+	The states can have any names. They are renumbered from 0 in
+	topological order, so that every arc goes from a lower state to a
+	higher one, unless the machine has cycles: the states on cycles
+	come last, in the order in which they were first seen.
+
+	Parameters
+	----------
+	arcs: iterable of tuple
+		``(i, word, j)`` or ``(i, word, j, score)``, as for
+		`WeightedLatticeWords`. An arc whose word is None is an empty arc,
+		and is replaced by copies of the arcs that follow it.
+	start: optional
+		the start state. By default, the one state that no arc goes into.
+	finals: optional
+		the final states. By default, the states that no arc leaves.
+		States that are left with no arcs once the empty arcs are
+		removed are dropped.
+	threshold: float, optional
+		as for `WeightedLatticeWords`.
+
+	Attributes
+	----------
+	state_ids: dict
+		the new number of each state.
+
+	Examples
+	--------
+
+	>>> import chart
+	>>> fsa = FiniteStateWords(arcify_named(demo_named_arcs))
+	>>> fsa.state_ids['6.1'], fsa.state_ids['9.2'], fsa.final_states
+	(7, 13, (14,))
+	>>> v = chart.parse(fsa, topcat='SImp', input_source=FiniteStateWords,
+	...                 return_chart=True, print_trees=False)
+	>>> v.solutions('SImp')
+	[C(SImp, 0, 14)]
+
+	A lattice can have several final states, and solutions can
+	be asked for between any pair of states:
+
+	>>> fsa = FiniteStateWords([('a', 'they', 'b'), ('b', 'suffer', 'c'), ('c', 'and', 'd'),
+	...                         ('d', 'they', 'e'), ('e', 'suffer', 'f')], finals=['c', 'f'])
+	>>> v = chart.Chart(fsa, input_source=FiniteStateWords)
+	>>> sorted(v.solutions('S'))
+	[C(S, 0, 2), C(S, 0, 5)]
+	>>> v.solutions('S', start=3)
+	[C(S, 3, 5)]
+	"""
+
+	def __init__(self, arcs, start=None, finals=None, threshold=None):
+		arcs = [tuple(a) if len(a) == 4 else tuple(a) + (0.0,) for a in arcs]
+		states = OrderedDict()
+		sources, targets = set(), set()
+		for i, _, j, _ in arcs:
+			states[i] = states[j] = None
+			sources.add(i)
+			targets.add(j)
+		if start is None:
+			starts = [q for q in states if q not in targets]
+			if len(starts) != 1:
+				raise ValueError("cannot tell the start state from %r" % starts)
+			start = starts[0]
+		if finals is None:
+			finals = [q for q in states if q not in sources]
+		states[start] = None
+		arcs, finals = remove_empty_arcs(arcs, finals)
+		used = set([start])
+		for i, _, j, _ in arcs:
+			used.add(i)
+			used.add(j)
+		states = [q for q in states if q in used]
+		finals = [f for f in finals if f in used]
+		order = topological_order(states, arcs, start)
+		ids = self.state_ids = dict((q, k) for k, q in enumerate(order))
+		self.start_state = ids[start]
+		self._final_states = tuple(sorted(ids[f] for f in finals))
+		self._final_state = len(order) - 1
+		WeightedLatticeWords.__init__(self, [(ids[i], w, ids[j], score) for i, w, j, score in arcs],
+									  threshold=threshold)
+
+	@property
+	def final_state(self):
+		return self._final_state
+
+	@property
+	def final_states(self):
+		return self._final_states
+
+
+def remove_empty_arcs(arcs, finals):
+	"""
+	Replace each path of empty arcs (with word None) by copies of
+	the arcs that leave its end, with the scores added. A state from
+	which a final state can be reached by empty arcs becomes final.
+	Return the new arcs and final states.
+
+	>>> remove_empty_arcs([(0, None, 1, -1.0), (1, 'a', 2, -2.0), (0, 'b', 2, 0.0)], [2])
+	([(1, 'a', 2, -2.0), (0, 'b', 2, 0.0), (0, 'a', 2, -3.0)], [2])
+	"""
+	empty = defaultdict(list)
+	out = defaultdict(list)
+	for arc in arcs:
+		(empty if arc[1] is None else out)[arc[0]].append(arc)
+	if not empty:
+		return arcs, finals
+	finals = set(finals)
+	result = [arc for arc in arcs if arc[1] is not None]
+	new_finals = set(finals)
+	for q in list(empty):
+		reached = {q: 0.0}
+		todo = [q]
+		while todo:
+			r = todo.pop()
+			for _, _, t, score in empty.get(r, ()):
+				if t not in reached:
+					reached[t] = reached[r] + score
+					todo.append(t)
+		for r, score in reached.items():
+			if r == q:
+				continue
+			if r in finals:
+				new_finals.add(q)
+			result.extend((q, w, t, score + s) for _, w, t, s in out.get(r, ()))
+	return result, sorted(new_finals)
+
+
+def topological_order(states, arcs, start):
+	"""
+	Order `states` so that arcs go forward, starting from `start`,
+	breaking ties by the order of `states`. States on cycles, which
+	have no such order, come last.
+
+	>>> topological_order(['x', 'y', 'z'], [('x', 'a', 'z', 0), ('z', 'b', 'y', 0)], 'x')
+	['x', 'z', 'y']
+	"""
+	rank = dict((q, k) for k, q in enumerate(states))
+	indegree = dict.fromkeys(states, 0)
+	out = defaultdict(list)
+	for i, _, j, _ in arcs:
+		out[i].append(j)
+		indegree[j] += 1
+	ready = sorted((q for q in states if indegree[q] == 0), key=lambda q: (q != start, rank[q]))
+	queue = deque(ready)
+	order = []
+	while queue:
+		q = queue.popleft()
+		order.append(q)
+		for t in sorted(out[q], key=rank.get):
+			indegree[t] -= 1
+			if indegree[t] == 0:
+				queue.append(t)
+	if len(order) < len(rank):
+		seen = set(order)
+		order.extend(q for q in states if q not in seen)
+	return order
+
+
+def lattice_arcs(source):
+	"""
+	The arcs of any input source as ``(i, word, j, score)``,
+	with its start and final states.
+	"""
+	weights = getattr(source, 'weights', None)
+	if weights is None:
+		arcs = [(i, w, j, 0.0) for i, w, j in source.arcs()]
+	else:
+		arcs = [(i, w, j, score) for (i, w, j), score in sorted(weights.items())]
+	finals = getattr(source, 'final_states', (source.final_state,))
+	return arcs, getattr(source, 'start_state', 0), list(finals)
+
+
+def trim(arcs, start, finals):
+	"""
+	Keep only the arcs on some path from `start` to a final state.
+
+	>>> trim([(0, 'a', 1, 0), (1, 'b', 2, 0), (0, 'c', 3, 0), (4, 'd', 2, 0)], 0, [2])
+	[(0, 'a', 1, 0), (1, 'b', 2, 0)]
+	"""
+	out, into = defaultdict(list), defaultdict(list)
+	for i, _, j, _ in arcs:
+		out[i].append(j)
+		into[j].append(i)
+
+	def closure(states, step):
+		seen = set(states)
+		todo = list(states)
+		while todo:
+			for t in step[todo.pop()]:
+				if t not in seen:
+					seen.add(t)
+					todo.append(t)
+		return seen
+
+	useful = closure([start], out) & closure(finals, into)
+	return [a for a in arcs if a[0] in useful and a[2] in useful]
+
+
+def determinize(arcs, start, finals):
+	"""
+	The subset construction over the words of an unweighted
+	lattice: afterwards, no state has two arcs with the same word.
+	The new states are frozensets of the old ones. Returns the
+	new arcs, start state and final states.
+
+	>>> arcs, start, finals = determinize([(0, 'a', 1, 0.0), (0, 'a', 2, 0.0), (1, 'b', 3, 0.0), (2, 'b', 3, 0.0)], 0, [3])
+	>>> len(arcs), sorted(finals)
+	(2, [frozenset([3])])
+	"""
+	out = defaultdict(lambda: defaultdict(set))
+	for i, w, j, _ in arcs:
+		out[i][w].add(j)
+	finals = set(finals)
+	first = frozenset([start])
+	seen = set([first])
+	todo = [first]
+	result, new_finals = [], []
+	while todo:
+		q = todo.pop()
+		if q & finals:
+			new_finals.append(q)
+		moves = defaultdict(set)
+		for r in q:
+			for w, ts in out[r].items():
+				moves[w].update(ts)
+		for w in sorted(moves):
+			t = frozenset(moves[w])
+			result.append((q, w, t, 0.0))
+			if t not in seen:
+				seen.add(t)
+				todo.append(t)
+	return result, first, new_finals
+
+
+def merge_equivalent_states(arcs, start, finals, reverse=False, combine=max):
+	"""
+	Merge the states that have the same futures: the same finality,
+	and arcs with the same words and scores to states that are
+	themselves equivalent, found by partition refinement. This is
+	minimization, for a deterministic lattice. With `reverse`, merge
+	the states with the same pasts instead. The new states are
+	numbered by equivalence class. Returns the new arcs, start
+	state and final states.
+
+	>>> arcs = [(0, 'a', 1, 0.0), (0, 'b', 2, 0.0), (1, 'c', 3, 0.0), (2, 'c', 4, 0.0)]
+	>>> merge_equivalent_states(arcs, 0, [3, 4])
+	([(0, 'a', 1, 0.0), (0, 'b', 1, 0.0), (1, 'c', 2, 0.0)], 0, [2])
+
+	Arcs from one state with the same word, into states that are merged,
+	become one arc, whose score is found with `combine`. The default,
+	`max`, keeps the best path, as Viterbi search does. Use `logadd`
+	to keep the total score of the paths, so that posteriors
+	(see `WeightedLatticeWords.posteriors`) do not change:
+
+	>>> arcs = [(0, 'a', 1, log(0.5)), (0, 'a', 2, log(0.5)), (1, 'b', 3, 0.0), (2, 'b', 3, 0.0)]
+	>>> [(i, w, j, round(exp(p), 6)) for i, w, j, p in merge_equivalent_states(arcs, 0, [3])[0]]
+	[(0, 'a', 1, 0.5), (1, 'b', 2, 1.0)]
+	>>> [(i, w, j, round(exp(p), 6)) for i, w, j, p in merge_equivalent_states(arcs, 0, [3], combine=logadd)[0]]
+	[(0, 'a', 1, 1.0), (1, 'b', 2, 1.0)]
+	"""
+	states = OrderedDict([(start, None)])
+	for i, _, j, _ in arcs:
+		states[i] = states[j] = None
+	out = defaultdict(list)
+	for i, w, j, score in arcs:
+		if reverse:
+			i, j = j, i
+		out[i].append((w, score, j))
+
+	def leaving(q, block):
+		scores = defaultdict(list)
+		for w, score, t in out[q]:
+			scores[w, block[t]].append(score)
+		return frozenset((key, reduce(combine, sorted(v))) for key, v in scores.items())
+
+	marked = set([start]) if reverse else set(finals)
+	order = topological_order(list(states), [(i, None, j, None) for i in out for _, _, j in out[i]],
+							  None)
+	position = dict((q, k) for k, q in enumerate(order))
+	if all(position[i] < position[j] for i in out for _, _, j in out[i]):
+		# acyclic: the futures of a state are known once those of its successors are
+		block, ids = {}, {}
+		for q in reversed(order):
+			key = q in marked, leaving(q, block)
+			block[q] = ids.setdefault(key, len(ids))
+		states = ()
+	else:
+		block = dict((q, q in marked) for q in states)
+		n = len(set(block.values()))
+	while states:
+		signature = dict((q, (block[q], leaving(q, block))) for q in states)
+		ids = {}
+		for q in states:
+			ids.setdefault(signature[q], len(ids))
+		block = dict((q, ids[signature[q]]) for q in states)
+		if len(ids) == n:
+			break
+		n = len(ids)
+	rank = {}
+	representative = {}
+	for q in order:
+		rank.setdefault(block[q], len(rank))
+		representative.setdefault(block[q], q)
+	block = dict((q, rank[b]) for q, b in block.items())
+	merged = []
+	for q in representative.values():
+		for (w, t), score in leaving(q, block):
+			merged.append((t, w, block[q], score) if reverse else (block[q], w, t, score))
+	return sorted(merged), block[start], sorted(set(block[f] for f in finals))
+
+
+def optimize_lattice(source, determinize_words=None, combine=max):
+	"""
+	Make a smaller lattice for the same word sequences, as
+	`FiniteStateWords`, with its states numbered consecutively.
+
+	The lattice is trimmed, determinized over its words, and then its
+	states with the same futures, and then those with the same pasts,
+	are merged. Determinization ignores scores, so by default it is
+	done only if every arc has the score 0, and `combine` is `max`;
+	merging respects scores. Arcs that merging makes into one have
+	their scores combined with `combine`, as for
+	`merge_equivalent_states`: `max` for Viterbi search, or
+	`logadd` to keep the posteriors of the arcs.
+	Determinization can make a lattice bigger, so the result is kept only
+	if it ends up with fewer states than merging alone gives.
+
+	>>> import chart
+	>>> fsa = FiniteStateWords(arcify_named(demo_redundant_arcs), start='s')
+	>>> small = optimize_lattice(fsa)
+	>>> fsa.final_state + 1, small.final_state + 1
+	(12, 7)
+	>>> big_chart = chart.Chart(fsa, input_source=FiniteStateWords)
+	>>> small_chart = chart.Chart(small, input_source=FiniteStateWords)
+	>>> sum(chart.edge_summary(big_chart).values()), sum(chart.edge_summary(small_chart).values())
+	(127, 92)
+	>>> big_chart.topcat = small_chart.topcat = 'S'
+	>>> big_chart.count_edges(), small_chart.count_edges()
+	(4, 3)
+
+	The stray arc into the start state is gone, and the two paths
+	for 'the pigeons suffer' have become one.
+
+	When two paths become one, `max` keeps the score of the better,
+	which changes the posteriors of the words, and `logadd` keeps
+	their total, which does not:
+
+	>>> fsa = FiniteStateWords([('s', 'the', 'a', log(0.3)), ('s', 'the', 'b', log(0.3)), ('s', 'a', 'c', log(0.4)),
+	...                         ('a', 'cat', 'f', 0.0), ('b', 'cat', 'f', 0.0), ('c', 'cat', 'f', 0.0)])
+	>>> def word_posteriors(lat):
+	...     r = {}
+	...     for (i, w, j), p in lat.posteriors().items():
+	...         r[w] = logadd(r.get(w, -INFINITE), p)
+	...     return sorted((w, round(exp(p), 3)) for w, p in r.items())
+	>>> word_posteriors(fsa)
+	[('a', 0.4), ('cat', 1.0), ('the', 0.6)]
+	>>> word_posteriors(optimize_lattice(fsa))
+	[('a', 0.571), ('cat', 1.0), ('the', 0.429)]
+	>>> word_posteriors(optimize_lattice(fsa, combine=logadd))
+	[('a', 0.4), ('cat', 1.0), ('the', 0.6)]
+	"""
+	arcs, start, finals = lattice_arcs(source)
+	arcs = trim(arcs, start, finals)
+	if determinize_words is None:
+		determinize_words = combine is max and all(score == 0.0 for _, _, _, score in arcs)
+	candidates = [(arcs, start, finals)]
+	if determinize_words:
+		candidates.append(determinize(arcs, start, finals))
+	best = None
+	for arcs, start, finals in candidates:
+		arcs, start, finals = merge_equivalent_states(arcs, start, finals, combine=combine)
+		arcs, start, finals = merge_equivalent_states(arcs, start, finals, reverse=True, combine=combine)
+		n = len(set(i for i, _, _, _ in arcs) | set(j for _, _, j, _ in arcs))
+		if best is None or n < best[0]:
+			best = n, arcs, start, finals
+	_, arcs, start, finals = best
+	return FiniteStateWords(arcs, start=start, finals=finals)
+
+
+class NBestWords(FiniteStateWords):
+
+	"""
+	An n-best list folded into one lattice, so that one chart
+	parses every hypothesis.
+
+	The hypotheses are merged where they share a beginning, as in a
+	trie, and then where they share an ending, by merging the states with
+	the same futures. The result is the smallest deterministic lattice for
+	the list. Because it is deterministic, each hypothesis has exactly one
+	path through it.
+
+	Parameters
+	----------
+	hypotheses: list
+		the hypotheses, each a list of words or a string.
+
+	Attributes
+	----------
+	hypotheses: list of tuple
+		the words of each hypothesis.
+	paths: list of tuple
+		the states that each hypothesis passes through.
+
+	Examples
+	--------
+
+	>>> import chart
+	>>> nbest = NBestWords(demo_nbest)
+	>>> sum(len(h) for h in nbest.hypotheses), nbest.final_state + 1
+	(17, 8)
+	>>> v = chart.Chart(nbest, input_source=NBestWords)
+	>>> [(e, nbest.covered(v, e)) for e in v.solutions('S')]
+	[(C(S, 0, 7), [0, 1, 3, 4])]
+	>>> nbest.parsed(v, 'S')
+	[0, 1, 3, 4]
+
+	The same hypotheses parse when they are parsed one at a time,
+	but that builds more complete edges:
+
+	>>> [k for k, h in enumerate(nbest.hypotheses) if chart.Chart(list(h)).solutions('S')]
+	[0, 1, 3, 4]
+	>>> sum(map(len, v.completes)), sum(sum(map(len, chart.Chart(list(h)).completes)) for h in nbest.hypotheses)
+	(39, 63)
+	"""
+
+	def __init__(self, hypotheses):
+		self.hypotheses = [tuple(h.split() if isinstance(h, basestring) else h) for h in hypotheses]
+		arcs = set()
+		for h in self.hypotheses:
+			if not h:
+				raise ValueError("empty hypothesis")
+			arcs.update((h[:k], h[k], h[:k + 1], 0.0) for k in range(len(h)))
+		arcs, start, finals = merge_equivalent_states(sorted(arcs), (), self.hypotheses)
+		FiniteStateWords.__init__(self, arcs, start=start, finals=finals)
+		step = dict(((i, w), j) for i, w, j in self.arcs())
+		self.paths = []
+		for h in self.hypotheses:
+			path = [self.start_state]
+			for w in h:
+				path.append(step[path[-1], w])
+			self.paths.append(tuple(path))
+
+	def covered(self, chart, e):
+		"""
+		The indices of the hypotheses that have an analysis as the
+		edge `e`, found by checking, in one bottom-up pass over the
+		forest of `e` for each hypothesis, which nodes lie along its path.
+		"""
+		f = chart.edge_forest(e)[0]
+		return [k for k in range(len(self.hypotheses)) if self._on_path(f, k)[f.roots[0]]]
+
+	def parsed(self, chart, topcat):
+		"""
+		The indices of the hypotheses that have an analysis
+		as `topcat`, in any solution.
+		"""
+		return sorted(set(k for e in chart.solutions(topcat) for k in self.covered(chart, e)))
+
+	def _on_path(self, f, k):
+		path, words = self.paths[k], self.hypotheses[k]
+		position = dict((q, n) for n, q in enumerate(path))
+		ok = [False] * len(f)
+		for i in range(len(f)):
+			left, right = position.get(f.lefts[i]), position.get(f.rights[i])
+			if left is None or right is None or left > right:
+				continue
+			if not f.edge_range(i):
+				ok[i] = (i not in f.dead and right == left + 1
+						 and f.symbols[f.labels[i]] == words[left])
+			else:
+				ok[i] = any(all(ok[c] for c in f.hyperedge(h)) for h in f.edge_range(i))
+		return ok
+
+
+NULL_WORDS = frozenset(['!NULL', '<s>', '</s>', '!SENT_START', '!SENT_END'])
+
+SLF_NAMES = dict(I='I', NODE='I', J='J', LINK='J', S='S', START='S', E='E', END='E',
+				 W='W', WORD='W', a='a', acoustic='a', l='l', language='l')
+
+
+def read_slf(source, null_words=NULL_WORDS, threshold=None, **scales):
+	"""
+	Read a lattice in HTK Standard Lattice Format, from a file name
+	or a file-like object, as `FiniteStateWords`. The file is read one
+	line at a time, and only the arcs are kept.
+
+	Words can be on the links or on the nodes they lead to. Words in
+	`null_words`, such as sentence markers, make empty arcs. The score
+	of an arc is ``acscale * a + lmscale * l + wdpenalty``, with the
+	scales taken from the header unless they are given as keywords,
+	and converted to natural logarithms from the header's ``base``.
+
+	>>> from StringIO import StringIO
+	>>> slf = StringIO(demo_slf)
+	>>> fsa = read_slf(slf)
+	>>> fsa.arcs()
+	[(0, 'the', 1), (0, 'they', 2), (1, 'pigeons', 2), (2, 'suffer', 3)]
+	>>> fsa.final_states
+	(3,)
+	>>> round(fsa.weights[0, 'they', 2], 6)
+	-6.5
+	>>> round(read_slf(StringIO(demo_slf), lmscale=1.0).weights[0, 'they', 2], 6)
+	-6.0
+
+	The word penalty is in the same base as the scores, so
+	it is converted along with them:
+
+	>>> slf10 = StringIO(demo_slf.replace('UTTERANCE=demo', 'UTTERANCE=demo base=10'))
+	>>> round(read_slf(slf10).weights[0, 'they', 2], 6), round(-6.5 * log(10), 6)
+	(-14.966803, -14.966803)
+	>>> import chart
+	>>> chart.ViterbiChart(fsa, input_source=FiniteStateWords).best_path()
+	[(0, 'they', 2), (2, 'suffer', 3)]
+	"""
+	f = open(source) if isinstance(source, basestring) else source
+	try:
+		header = {}
+		node_words = {}
+		links = []
+		for line in f:
+			fields = line.split()
+			if not fields or fields[0].startswith('#'):
+				continue
+			record = {}
+			for field in fields:
+				name, _, value = field.partition('=')
+				record[SLF_NAMES.get(name, name)] = value
+			if 'J' in record:
+				links.append((record['S'], record.get('W'), record['E'],
+							  float(record.get('a', 0.0)), float(record.get('l', 0.0))))
+			elif 'I' in record:
+				if 'W' in record:
+					node_words[record['I']] = record['W']
+			else:
+				header.update(record)
+	finally:
+		if f is not source:
+			f.close()
+	base = header.get('base', 'e')
+	unit = 1.0 if base == 'e' else log(float(base))
+	acscale = scales.get('acscale', float(header.get('acscale', 1.0)))
+	lmscale = scales.get('lmscale', float(header.get('lmscale', 1.0)))
+	wdpenalty = scales.get('wdpenalty', float(header.get('wdpenalty', 0.0)))
+	arcs = []
+	for i, w, j, a, l in links:
+		if w is None:
+			w = node_words.get(j)
+		if w is None or w in null_words:
+			arcs.append((i, None, j, unit * (acscale * a + lmscale * l)))
+		else:
+			arcs.append((i, w, j, unit * (acscale * a + lmscale * l + wdpenalty)))
+	return FiniteStateWords(arcs, start=header.get('start'),
+							finals=[header['end']] if 'end' in header else None,
+							threshold=threshold)
+
+
+def arcify_named(s):
+	"""
+	Read arcs with named states, one to a line.
+	"""
+	return [tuple(line.split()) for line in s.split('\n') if line.strip()]
+
+
+##
+# the lattice from the introduction, with its original state names
+##
+
+demo_named_arcs = """0 show 1
+1 me 2
+2 a 3
+3 movie 4
+4 where 5
+5 the 6
+6 director 7
+6 direct 6.1
+6 dye 6.2
+6.1 or 7
+6.2 rector 7
+7 is 8
+8 clint 9
+9 eastwood 10
+9 is 9.1
+9 east 9.1
+9 is 9.2
+9.1 wood 10
+9.2 would 10"""
+
+
+##
+# a small lattice in HTK format, with words on the nodes and
+# links, sentence markers and a language model scale
+##
+
+demo_slf = """VERSION=1.0
+UTTERANCE=demo
+lmscale=2.0 wdpenalty=-1.0
+N=5 L=5
+I=0 W=!NULL
+I=1
+I=2 W=the
+I=3 W=suffer
+I=4 W=</s>
+J=0 S=0 E=1 W=they a=-4.5 l=-0.5
+J=1 S=0 E=2 a=-1.0 l=-0.2
+J=2 S=2 E=1 W=pigeons a=-2.0 l=-1.0
+J=3 S=1 E=3 a=-3.0 l=-0.7
+J=4 S=3 E=4 a=0.0 l=-0.1
+"""
+
+
+##
+# a redundant lattice, with the same words on different paths
+##
+
+demo_redundant_arcs = """s the p1
+s the p2
+s a p3
+p1 pigeons q1
+p2 pigeons q2
+p3 pigeon q3
+q1 suffer f1
+q2 suffer f2
+q3 suffers f3
+q1 are r
+r punished f1
+x stray s"""
+
+
+##
+# an n-best list
+##
+
+demo_nbest = ['the pigeons are punished',
+			  'the pigeon are punished',
+			  'the pigeons are punish',
+			  'the pigeons suffer',
+			  'they suffer']
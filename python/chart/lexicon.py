@@ -0,0 +1,273 @@
+"""
+On-disk lexicons
+================
+
+A production lexicon can be too big to turn into category objects
+in every worker process. The backends in this module leave the lexicon
+on disk and decode the categories of a word only when that word turns up
+in the input, keeping the most recently used entries in a bounded cache.
+Resident memory is then proportional to the active vocabulary, not to
+the size of the lexicon.
+
+There are two backends:
+
+	- `MappedLexicon` reads a text file in the same format as
+	  `english.WORDS`, sorted by word, through ``mmap``, and finds words
+	  by binary search. Only the pages that are searched are read in, and
+	  forked workers share them.
+
+	- `SQLiteLexicon` reads a local SQLite file.
+
+Either can be given to `english.Grammar`, `features.Grammar` or
+`features.make_feature_grammar` in place of the `WORDS` string.
+Each grammar decodes the entries in its own way.
+
+Examples
+--------
+
+>>> import os, tempfile, chart, english, features
+>>> path = os.path.join(tempfile.mkdtemp(), 'words.lex')
+>>> write_sorted_lexicon(english.WORDS, path)
+>>> lexicon = MappedLexicon(path, maxsize=2)
+>>> g = english.Grammar(english.RULES, lexicon)
+>>> chart.parse(['the', 'pigeons', 'suffer'], grammar=g)
+['the', 'pigeons', 'suffer']
+Parse 1:
+S
+ Np
+  det the
+  Nn
+   n pigeons
+ Vp
+  v suffer
+1 parses
+>>> len(g.lexicon.cache)
+2
+>>> g.lexicon['by']
+('passmarker', 'prep')
+>>> 'banana' in g.lexicon
+False
+
+>>> g = features.make_feature_grammar(words=lexicon)
+>>> g.lexicon['by']
+(passmarker, prep)
+>>> chart.parse(['the', 'pigeon', 'suffer'], grammar=g, use_features=True)
+['the', 'pigeon', 'suffer']
+No parse
+
+>>> db = os.path.join(tempfile.mkdtemp(), 'words.db')
+>>> write_sqlite_lexicon(english.WORDS, db)
+>>> g = english.Grammar(english.RULES, SQLiteLexicon(db))
+>>> g.lexicon.get('cages')
+('n', 'v')
+"""
+
+##
+# license: Apache 2.0
+##
+
+from collections import OrderedDict
+import mmap
+import os
+import sqlite3
+
+
+def sorted_entries(words):
+	"""
+	Read lexicon text into ``(word, entry)`` pairs, sorted by word,
+	merging the entries of words that are listed more than once.
+
+	>>> sorted_entries("run v\\nball n\\nrun n")
+	[('ball', 'n'), ('run', 'v | n')]
+	"""
+	entries = OrderedDict()
+	for line in words.split('\n'):
+		if line.strip():
+			w, entry = line.split(None, 1)
+			entry = entry.strip()
+			entries[w] = entries[w] + ' | ' + entry if w in entries else entry
+	return sorted(entries.items())
+
+
+def write_sorted_lexicon(words, path):
+	"""
+	Write lexicon text as a file that `MappedLexicon` can read.
+	"""
+	with open(path, 'wb') as f:
+		for w, entry in sorted_entries(words):
+			f.write('%s %s\n' % (w, entry))
+
+
+def write_sqlite_lexicon(words, path):
+	"""
+	Write lexicon text as a SQLite file that `SQLiteLexicon` can read.
+	"""
+	db = sqlite3.connect(path)
+	try:
+		db.execute('CREATE TABLE IF NOT EXISTS lexicon (word TEXT PRIMARY KEY, entry TEXT)')
+		db.executemany('INSERT OR REPLACE INTO lexicon VALUES (?, ?)', sorted_entries(words))
+		db.commit()
+	finally:
+		db.close()
+
+
+class DiskLexicon(object):
+	"""
+	A read-only mapping from words to categories, backed by a file.
+
+	Subclasses find the raw entry text of a word; this class decodes it
+	and keeps the `maxsize` most recently used decoded entries in `cache`.
+
+	Parameters
+	----------
+	path: string
+		the file to read.
+	decode: function
+		turns the text of an entry into a tuple of categories. Grammars
+		supply their own, through `decoded_by`.
+	maxsize: integer
+		the number of decoded entries to keep.
+	"""
+
+	def __init__(self, path, decode=None, maxsize=10000):
+		self.path = path
+		self.decode = decode
+		self.maxsize = maxsize
+		self.cache = OrderedDict()
+
+	@property
+	def cache_key(self):
+		"""
+		Identifies the file and its contents for `english.GrammarCache`.
+		"""
+		st = os.stat(self.path)
+		return '%s:%s:%d:%d' % (type(self).__name__, os.path.abspath(self.path), st.st_size, st.st_mtime)
+
+	def decoded_by(self, decode):
+		"""
+		A view of the same file that decodes entries with `decode`.
+		"""
+		if decode is self.decode:
+			return self
+		view = type(self).__new__(type(self))
+		view.__dict__.update(self.__dict__)
+		view.decode = decode
+		view.cache = OrderedDict()
+		return view
+
+	def lookup(self, word):
+		"""
+		Return the raw entry text for `word`, or None.
+		"""
+		raise NotImplementedError  # pragma no cover
+
+	def words(self):
+		"""
+		Generate the words, in sorted order.
+		"""
+		raise NotImplementedError  # pragma no cover
+
+	def get(self, word, default=None):
+		cache = self.cache
+		try:
+			r = cache.pop(word)
+		except KeyError:
+			entry = self.lookup(word)
+			if entry is None:
+				return default
+			r = self.decode(entry) if self.decode else entry
+		cache[word] = r
+		if len(cache) > self.maxsize:
+			cache.popitem(last=False)
+		return r
+
+	def __getitem__(self, word):
+		r = self.get(word)
+		if r is None:
+			raise KeyError(word)
+		return r
+
+	def __contains__(self, word):
+		return word in self.cache or self.lookup(word) is not None
+
+	def __iter__(self):
+		return self.words()
+
+	def __len__(self):
+		return sum(1 for _ in self.words())
+
+
+class MappedLexicon(DiskLexicon):
+	"""
+	A lexicon in a sorted text file, read through ``mmap``.
+
+	Each line has the form ``word category ( | category)*``, and
+	the lines are sorted by word, as written by `write_sorted_lexicon`.
+	"""
+
+	def __init__(self, path, decode=None, maxsize=10000):
+		DiskLexicon.__init__(self, path, decode=decode, maxsize=maxsize)
+		with open(path, 'rb') as f:
+			if os.fstat(f.fileno()).st_size:
+				self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+			else:
+				self._mm = ''
+
+	def _line(self, start):
+		end = self._mm.find('\n', start)
+		if end == -1:
+			end = len(self._mm)
+		return end, self._mm[start:end]
+
+	def lookup(self, word):
+		"""
+		Binary search for the line of `word`. `lo` is always at the
+		start of a line, and every line at or after `hi` is too late.
+		"""
+		mm = self._mm
+		lo, hi = 0, len(mm)
+		while lo < hi:
+			mid = (lo + hi) // 2
+			start = mm.rfind('\n', lo, mid) + 1 or lo
+			end, line = self._line(start)
+			w, entry = line.split(None, 1)
+			if w == word:
+				return entry
+			elif w < word:
+				lo = end + 1
+			else:
+				hi = start
+		return None
+
+	def words(self):
+		start = 0
+		while start < len(self._mm):
+			start, line = self._line(start)
+			start += 1
+			yield line.split(None, 1)[0]
+
+	def close(self):
+		if self._mm:
+			self._mm.close()
+
+
+class SQLiteLexicon(DiskLexicon):
+	"""
+	A lexicon in a SQLite file, as written by `write_sqlite_lexicon`.
+	"""
+
+	def __init__(self, path, decode=None, maxsize=10000):
+		DiskLexicon.__init__(self, path, decode=decode, maxsize=maxsize)
+		self._db = sqlite3.connect(path, check_same_thread=False)
+		self._db.text_factory = str
+
+	def lookup(self, word):
+		row = self._db.execute('SELECT entry FROM lexicon WHERE word = ?', (word,)).fetchone()
+		return None if row is None else row[0]
+
+	def words(self):
+		for (w,) in self._db.execute('SELECT word FROM lexicon ORDER BY word'):
+			yield w
+
+	def close(self):
+		self._db.close()
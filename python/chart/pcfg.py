@@ -0,0 +1,361 @@
+"""
+Probabilistic grammars
+======================
+
+A `PCFG` is an `english.Grammar` with a probability on every rule,
+including the lexical rules that rewrite a preterminal as a word. The
+probabilities come from weights, which are normalized so that the rules
+for each left-hand side sum to one. A rule with no weight given gets
+weight 1, so an empty table gives each category a uniform distribution
+over its expansions.
+
+Weights are written one rule to a line, as ``lhs -> rhs : weight``,
+with the features left off, as they are ignored here. For a word, the
+rule is ``category -> word``, and the probability is that of the word
+given its category.
+
+`chart.ViterbiChart` uses the log-probabilities to find the most
+probable parse, best first, and `chart.AStarChart` also uses the
+`OutsideEstimates` of the grammar to look at fewer edges on the way.
+
+Examples
+--------
+
+>>> g = get_pcfg()
+>>> round(exp(g.rule_logprobs['S', ('Np', 'Vp')]), 3)
+0.615
+>>> round(exp(g.rule_logprobs['SImp', ('Vp',)]), 3)
+1.0
+>>> round(exp(g.word_logprobs['det', ('the',)]), 3)
+0.455
+"""
+
+##
+# license: Apache 2.0
+##
+
+from collections import defaultdict
+from math import exp, log
+
+import english
+from forest import INFINITE
+
+
+RULE_WEIGHTS = """S -> Np Vp : 8
+S -> S conj S : 1
+S -> Np cop ppart : 3
+S -> Np cop ppart passmarker Np : 1
+Np -> det Nn : 6
+Np -> Np Pp : 2
+Np -> pn : 4
+Np -> Np Relp : 1
+Np -> Np conj Np : 1
+Nn -> n : 4
+Nn -> adj n : 1
+Vp -> v Np : 4
+Vp -> v : 3
+Vp -> cop adj : 2
+Vp -> cop Pn : 1
+Vp -> v Np Np : 1
+Vp -> Vp Pp : 1
+Pn -> n : 2
+Pn -> n Pn : 1"""
+
+WORD_WEIGHTS = """det -> the : 10
+det -> a : 4
+pn -> they : 4
+pn -> he : 2
+pn -> she : 2
+prep -> in : 2
+prep -> on : 2"""
+
+
+def read_weights(text):
+	"""
+	Read a table of rule weights.
+
+	>>> sorted(read_weights("S -> Np Vp : 3\\ndet -> the : 0.5").items())
+	[(('S', ('Np', 'Vp')), 3.0), (('det', ('the',)), 0.5)]
+	"""
+	weights = {}
+	for line in text.split('\n'):
+		if line.strip():
+			rule, weight = line.rsplit(':', 1)
+			lhs, rhs = rule.split('->')
+			weights[lhs.strip(), tuple(rhs.split())] = float(weight)
+	return weights
+
+
+def normalize(rules, weights):
+	"""
+	Turn the weights of `rules`, given as ``(lhs, rhs)`` pairs, into
+	log-probabilities conditioned on the left-hand side.
+
+	>>> lp = normalize([('S', ('Np', 'Vp')), ('S', ('Vp',))], {('S', ('Vp',)): 3})
+	>>> round(exp(lp['S', ('Vp',)]), 2)
+	0.75
+
+	Weights for rules that are not in the grammar are an error:
+
+	>>> normalize([('S', ('Vp',))], {('S', ('Np',)): 1})
+	Traceback (most recent call last):
+	...
+	ValueError: weight given for a rule not in the grammar: S -> Np
+	"""
+	rules = set(rules)
+	for lhs, rhs in weights:
+		if (lhs, rhs) not in rules:
+			raise ValueError("weight given for a rule not in the grammar: %s -> %s" % (lhs, ' '.join(rhs)))
+	totals = defaultdict(float)
+	for r in rules:
+		totals[r[0]] += weights.get(r, 1.0)
+	return dict((r, log(weights.get(r, 1.0) / totals[r[0]])) for r in rules)
+
+
+class WordLogprobs(object):
+
+	"""
+	The log-probabilities of words given their categories, worked out
+	a word at a time, so that the lexicon is not copied into a table.
+
+	Normalizing needs the total weight of each category. The totals
+	are found the first time they are needed, in one pass over the
+	lexicon that keeps only a few numbers for each category, so an
+	on-disk lexicon (see `lexicon`) is read through, but stays on disk.
+
+	>>> lp = WordLogprobs({'the': ('det',), 'a': ('det',), 'dog': ('n',)}, {('det', ('the',)): 3})
+	>>> round(exp(lp['det', ('the',)]), 2), round(exp(lp['det', ('a',)]), 2)
+	(0.75, 0.25)
+	>>> round(exp(lp.best('det')), 2), lp.categories()
+	(0.75, ['det', 'n'])
+	>>> lp['n', ('the',)]
+	Traceback (most recent call last):
+	...
+	KeyError: ('n', ('the',))
+
+	Weights for words that the lexicon does not have are an error, as in `normalize`:
+
+	>>> WordLogprobs({'dog': ('n',)}, {('n', ('cat',)): 1})
+	Traceback (most recent call last):
+	...
+	ValueError: weight given for a rule not in the grammar: n -> cat
+	"""
+
+	def __init__(self, lexicon, weights):
+		for c, (w,) in weights:
+			if c not in lexicon.get(w, ()):
+				raise ValueError("weight given for a rule not in the grammar: %s -> %s" % (c, w))
+		self.lexicon = lexicon
+		self.weights = weights
+		self._totals = None
+
+	def _count(self):
+		totals = defaultdict(float)
+		best = defaultdict(float)
+		for w in self.lexicon:
+			for c in self.lexicon.get(w, ()):
+				weight = self.weights.get((c, (w,)), 1.0)
+				totals[c] += weight
+				best[c] = max(best[c], weight)
+		self._totals = dict(totals)
+		self._best = dict(best)
+
+	def __getitem__(self, key):
+		c, (w,) = key
+		if c not in self.lexicon.get(w, ()):
+			raise KeyError(key)
+		if self._totals is None:
+			self._count()
+		return log(self.weights.get(key, 1.0) / self._totals[c])
+
+	def best(self, c):
+		"""
+		The log-probability of the most probable word of category `c`.
+		"""
+		if self._totals is None:
+			self._count()
+		return log(self._best[c] / self._totals[c])
+
+	def categories(self):
+		"""
+		The categories that have words, sorted.
+		"""
+		if self._totals is None:
+			self._count()
+		return sorted(self._totals)
+
+
+class PCFG(english.Grammar):
+
+	"""
+	A plain grammar with rule probabilities.
+
+	Parameters
+	----------
+	grammar: string
+		the grammar rules, as for `english.Grammar`.
+	lexicon: string or lexicon
+		the words, as for `english.Grammar`. Every word is read once,
+		to normalize the lexical probabilities, but only when they are
+		first needed, and without being kept.
+	rule_weights: string
+		weights for the phrasal rules.
+	word_weights: string
+		weights for the lexical rules.
+
+	Attributes
+	----------
+	rule_logprobs: dict
+		maps ``(lhs, rhs)``, with `rhs` a tuple, to the natural log of the
+		probability of the rule.
+	word_logprobs: WordLogprobs
+		maps ``(category, (word,))`` to the natural log of the
+		probability of the word given the category, looking the
+		word up only when it is asked for.
+	"""
+
+	def __init__(self, grammar, lexicon, rule_weights=RULE_WEIGHTS, word_weights=WORD_WEIGHTS, state=None):
+		english.Grammar.__init__(self, grammar, lexicon, state=state)
+		self.rule_logprobs = normalize([(r.lhs, tuple(r.rhs)) for r in self.grammar],
+									   read_weights(rule_weights))
+		self.word_logprobs = WordLogprobs(self.lexicon, read_weights(word_weights))
+		self._estimates = {}
+
+	def outside_estimates(self, topcat, length):
+		"""
+		Return `OutsideEstimates` for parses rooted in `topcat` of
+		inputs of up to `length` words. They are kept with the grammar,
+		and recomputed, for twice the length, only when a longer input
+		comes along.
+		"""
+		est = self._estimates.get(topcat)
+		if est is None or est.length < length:
+			if est is not None:
+				length = max(length, 2 * est.length)
+			est = self._estimates[topcat] = OutsideEstimates(self, topcat, length)
+		return est
+
+
+class OutsideEstimates(object):
+
+	"""
+	Upper bounds on the outside log-probability of an edge, given
+	its category and the number of words outside it: the best score
+	that any context of that many words could give the category, in a
+	parse rooted in `topcat`. The words themselves are not looked at,
+	and the split of the context into words to the left and words to
+	the right is left open, so the estimates for every input of up to
+	`length` words are computed once, from the grammar alone.
+
+	The inside scores of sequences of categories are bounded in the
+	same way, from the best word for each preterminal. The
+	estimates are admissible and consistent, so A* search with them
+	finds the Viterbi parse.
+
+	>>> g = get_pcfg()
+	>>> est = g.outside_estimates('S', 8)
+	>>> est.complete('S', 0)
+	0.0
+	>>> round(est.complete('Vp', 1), 6), round(est.complete('Vp', 2), 6)
+	(-3.124565, -5.981993)
+	>>> est.complete('Vp', 0)
+	-inf
+
+	A partial ``S`` that needs a ``Vp``, with two words to go,
+	can do no better than to have a ``Vp`` take both of them:
+
+	>>> est.partial('S', ('Vp',), 2) == est.inside['Vp'][2]
+	True
+	"""
+
+	def __init__(self, grammar, topcat, length):
+		self.topcat = topcat
+		self.length = length
+		rules = [(r.lhs, tuple(r.rhs), grammar.rule_logprobs[r.lhs, tuple(r.rhs)]) for r in grammar.grammar]
+		blank = [-INFINITE] * (length + 1)
+		self.inside = defaultdict(lambda: list(blank))
+		for cat in grammar.word_logprobs.categories():
+			self.inside[cat][1] = grammar.word_logprobs.best(cat)
+		seqs = sorted(set(rhs[i:j] for _, rhs, _ in rules
+						  for i in range(len(rhs)) for j in range(i, len(rhs) + 1)), key=len)
+		self.sequences = dict((seq, list(blank)) for seq in seqs)
+		self.sequences[()][0] = 0.0
+		for k in range(1, length + 1):
+			self._inside_at(k, rules, seqs)
+		self.outside = defaultdict(lambda: list(blank))
+		self.outside[topcat][0] = 0.0
+		contexts = []
+		for lhs, rhs, lp in rules:
+			for t in range(len(rhs)):
+				pre, post = self.sequences[rhs[:t]], self.sequences[rhs[t + 1:]]
+				sibs = [max(pre[a] + post[k - a] for a in range(k + 1)) for k in range(length + 1)]
+				contexts.append((rhs[t], lhs, lp, sibs))
+		for c in range(length):
+			self._outside_at(c, contexts)
+		self._partials = {}
+
+	def _inside_at(self, k, rules, seqs):
+		changed = True
+		while changed:
+			for seq in seqs:
+				if seq:
+					first, rest = self.inside[seq[0]], self.sequences[seq[1:]]
+					self.sequences[seq][k] = max(first[a] + rest[k - a] for a in range(1, k + 1))
+			changed = False
+			for lhs, rhs, lp in rules:
+				score = lp + self.sequences[rhs][k]
+				if score > self.inside[lhs][k]:
+					self.inside[lhs][k] = score
+					changed = True
+
+	def _outside_at(self, c, contexts):
+		changed = True
+		while changed:
+			changed = False
+			for cat, lhs, lp, sibs in contexts:
+				mother = self.outside[lhs]
+				score = max(mother[c - k] + lp + sibs[k] for k in range(c + 1))
+				if score > self.outside[cat][c]:
+					self.outside[cat][c] = score
+					changed = True
+
+	def complete(self, cat, context):
+		"""
+		The estimate for a complete edge labelled `cat`
+		with `context` words outside it.
+		"""
+		return self.outside[cat][context] if cat in self.outside else -INFINITE
+
+	def partial(self, cat, needed, context):
+		"""
+		The estimate for a partial edge labelled `cat`, still needing
+		the categories `needed`, with `context` words outside it. Its
+		inside score already includes the probability of its rule.
+		"""
+		key = cat, needed, context
+		try:
+			return self._partials[key]
+		except KeyError:
+			pass
+		rest = self.sequences.get(needed)
+		mother = self.outside.get(cat)
+		if rest is None or mother is None:
+			r = -INFINITE
+		else:
+			r = max(rest[k] + mother[context - k] for k in range(context + 1))
+		r = self._partials[key] = r
+		return r
+
+
+def get_pcfg(rules=None, lexicon=None):
+	"""
+	Fetch a compiled probabilistic grammar, with the default
+	weights, from the process-wide grammar cache.
+
+	>>> get_pcfg() is get_pcfg()
+	True
+	"""
+	return english.GRAMMARS.get('pcfg',
+								english.RULES if rules is None else rules,
+								english.WORDS if lexicon is None else lexicon,
+								PCFG)
@@ -0,0 +1,500 @@
+"""
+Precompiled grammars
+====================
+
+Reading a grammar from text means re-parsing every rule and every
+lexical entry each time a process starts. For a large lexicon this
+takes seconds. This module writes an already compiled grammar to a
+versioned binary file, and loads it back by memory-mapping that file.
+Nothing is decoded at load time: rules and words are decoded when the
+chart first asks for them, so start-up is near-instant, and forked workers share
+the mapped pages.
+
+File layout
+-----------
+
+All integers are unsigned, 32 bit and little-endian. After the header
+come these sections, in order:
+
+    ==================  ==========================================
+    symbol offsets      ``n_symbols + 1`` offsets into the symbol text
+    symbol text         the symbols, as written in grammar source
+    rule lhs            ``n_rules`` symbol ids
+    rule rhs starts     ``n_rules + 1`` offsets into the rhs ids
+    rhs ids             ``n_rhs`` symbol ids
+    key offsets         ``n_keys + 1`` offsets into the key text
+    key text            the sorted first-symbol index keys
+    posting starts      ``n_keys + 1`` offsets into the postings
+    postings            ``n_postings`` rule ids, in grammar order
+    word offsets        ``n_words + 1`` offsets into the word text
+    word text           the sorted words of the lexicon
+    entry starts        ``n_words + 1`` offsets into the entries
+    entries             ``n_entries`` category symbol ids
+    ==================  ==========================================
+
+Feature categories are stored in the same form as the grammar source,
+with their re-entrancy constraints, so that each rule can be rebuilt
+exactly.
+
+Examples
+--------
+
+>>> import os, tempfile, chart, english, features
+>>> path = os.path.join(tempfile.mkdtemp(), 'english.cpg')
+>>> write_grammar(english.GRAMMAR, path)
+>>> g = load_grammar(path)
+>>> list(g.grammar) == english.GRAMMAR.grammar
+True
+>>> g.lexicon['by']
+('passmarker', 'prep')
+>>> chart.parse(['the', 'pigeons', 'suffer'], grammar=g)
+['the', 'pigeons', 'suffer']
+Parse 1:
+S
+ Np
+  det the
+  Nn
+   n pigeons
+ Vp
+  v suffer
+1 parses
+
+>>> write_grammar(features.make_feature_grammar(), path)
+>>> g = load_grammar(path)
+>>> list(g.grammar) == features.make_feature_grammar().grammar
+True
+>>> g.lexicon.get('sheep')
+(n,)
+>>> chart.parse(['the', 'pigeon', 'suffers'], grammar=g, use_features=True)
+['the', 'pigeon', 'suffers']
+Parse 1:
+S(num:sing)
+ Np(num:sing)
+  det the
+  Nn(num:sing)
+   n(num:sing) pigeon
+ Vp(num:sing)
+  v(num:sing,tr:intrans) suffers
+1 parses
+
+The tables made from all the rules are the same as the
+original grammar's, and are made once:
+
+>>> f = features.make_feature_grammar()
+>>> g.left_corner.has_edge(f.grammar[0].lhs, f.grammar[0].rhs[0])
+True
+>>> g.symbols == f.symbols, g.symbols is g.symbols
+(True, True)
+"""
+
+##
+# license: Apache 2.0
+##
+
+import mmap
+import struct
+
+import english
+import features
+
+
+MAGIC = 'CHPG'
+FORMAT_VERSION = 2
+
+CFG = 0
+FEATURES = 1
+
+HEADER = struct.Struct('<4sHHIIIIIIIIII')
+U32 = struct.Struct('<I')
+
+
+def category_spec(category, constraints=()):
+    """
+    Write a feature category back out in grammar source form,
+    adding the names of the features it shares with the rest of its rule.
+
+    >>> c = features.ImmutableCategory.from_string('Np(case:subj)')
+    >>> category_spec(c, frozenset(['num']))
+    'Np(case:subj,num)'
+    """
+    fs = [":".join(f) for f in sorted(category.features)] + sorted(constraints)
+    if fs:
+        return "{cat}({fs})".format(cat=category.cat, fs=",".join(fs))
+    else:
+        return category.cat
+
+
+def rule_specs(rule):
+    """
+    Return the lhs and rhs symbols of `rule` as strings
+    from which it can be rebuilt.
+
+    >>> r = features.ImmutableRule('S(num)', ['Np(num,case:subj)', 'Vp(num)'])
+    >>> rule_specs(r)
+    ('S(num)', ['Np(case:subj,num)', 'Vp(num)'])
+    """
+    if not isinstance(rule, features.ImmutableRule):
+        return rule.lhs, list(rule.rhs)
+    if rule.constraints is None:
+        lhsc, rhsc = frozenset(), [frozenset() for _ in rule.rhs]
+    else:
+        lhsc, rhsc = rule.constraints
+    return (category_spec(rule.lhs, lhsc),
+            [category_spec(r, c) for r, c in zip(rule.rhs, rhsc)])
+
+
+def _u32s(values):
+    return struct.pack('<%dI' % len(values), *values)
+
+
+def _strings(strings):
+    offsets = [0]
+    for s in strings:
+        offsets.append(offsets[-1] + len(s))
+    return _u32s(offsets), "".join(strings)
+
+
+def write_grammar(grammar, path):
+    """
+    Write a compiled grammar to a binary file.
+
+    Parameters
+    ----------
+    grammar: english.Grammar or features.Grammar
+        the grammar to write.
+    path: string
+        where to write it.
+    """
+    kind = FEATURES if isinstance(grammar, features.Grammar) else CFG
+    symbols = {}
+    lhs, starts, rhs = [], [0], []
+    for rule in grammar.grammar:
+        l, r = rule_specs(rule)
+        lhs.append(symbols.setdefault(l, len(symbols)))
+        rhs.extend(symbols.setdefault(x, len(symbols)) for x in r)
+        starts.append(len(rhs))
+    words = sorted(grammar.lexicon)
+    entries, entry_starts = [], [0]
+    for w in words:
+        for c in grammar.lexicon[w]:
+            c = c if kind == CFG else category_spec(c)
+            entries.append(symbols.setdefault(c, len(symbols)))
+        entry_starts.append(len(entries))
+    symbol_list = sorted(symbols, key=symbols.get)
+
+    ids = dict((id(rule), i) for i, rule in enumerate(grammar.grammar))
+    keys = sorted(grammar.first)
+    postings, posting_starts = [], [0]
+    for k in keys:
+        postings.extend(ids[id(rule)] for rule in grammar.first[k])
+        posting_starts.append(len(postings))
+
+    symbol_offsets, symbol_text = _strings(symbol_list)
+    key_offsets, key_text = _strings(keys)
+    word_offsets, word_text = _strings(words)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, kind,
+                         len(symbol_list), len(symbol_text),
+                         len(lhs), len(rhs),
+                         len(keys), len(key_text),
+                         len(postings),
+                         len(words), len(word_text),
+                         len(entries))
+    with open(path, 'wb') as f:
+        for section in (header,
+                        symbol_offsets, symbol_text,
+                        _u32s(lhs), _u32s(starts), _u32s(rhs),
+                        key_offsets, key_text,
+                        _u32s(posting_starts), _u32s(postings),
+                        word_offsets, word_text,
+                        _u32s(entry_starts), _u32s(entries)):
+            f.write(section)
+
+
+class _Rules(object):
+    """
+    Read-only sequence view of the rules of a mapped grammar.
+    """
+    def __init__(self, grammar):
+        self._grammar = grammar
+
+    def __len__(self):
+        return self._grammar.n_rules
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._grammar.rule(i)
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self._grammar.rule(i)
+
+
+class _FirstIndex(object):
+    """
+    Read-only mapping view of the first-symbol index of a mapped grammar.
+    """
+    def __init__(self, grammar):
+        self._grammar = grammar
+
+    def get(self, key, default=None):
+        return self._grammar.starting_with(key, default)
+
+    def __getitem__(self, key):
+        r = self.get(key)
+        if r is None:
+            raise KeyError(key)
+        return r
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return self._grammar.n_keys
+
+    def __iter__(self):
+        for i in xrange(self._grammar.n_keys):
+            yield self._grammar._key(i)
+
+
+class _Lexicon(object):
+    """
+    Read-only mapping view of the lexicon of a mapped grammar.
+    """
+    def __init__(self, grammar):
+        self._grammar = grammar
+
+    def get(self, word, default=None):
+        return self._grammar.categories(word, default)
+
+    def __getitem__(self, word):
+        r = self.get(word)
+        if r is None:
+            raise KeyError(word)
+        return r
+
+    def __contains__(self, word):
+        return self.get(word) is not None
+
+    def __len__(self):
+        return self._grammar.n_words
+
+    def __iter__(self):
+        for i in xrange(self._grammar.n_words):
+            yield self._grammar._word(i)
+
+
+class MappedGrammar(english.RandomStateMixin):
+
+    """
+    A grammar backed by a memory-mapped file written by `write_grammar`.
+
+    It has the same interface as the grammar it was written from,
+    so can be used wherever that grammar could. Rules, index
+    entries and lexical entries are decoded on first use, and kept.
+    The tables that need every rule, such as `symbols`, `expansions`,
+    `left_corners` and `left_corner`, are made the first time they
+    are asked for, and kept too.
+
+    Parameters
+    ----------
+    path: string
+        the file to load.
+    state: numpy.random.RandomState
+        the random state for the grammar.
+    """
+
+    def __init__(self, path, state=None):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.kind,
+         self.n_symbols, symbol_bytes,
+         self.n_rules, n_rhs,
+         self.n_keys, key_bytes,
+         n_postings,
+         self.n_words, word_bytes,
+         n_entries) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError("%s is not a precompiled grammar" % path)
+        if version != FORMAT_VERSION:
+            raise ValueError("%s has format version %d, expected %d"
+                             % (path, version, FORMAT_VERSION))
+        offset = HEADER.size
+        sections = {}
+        for name, size in (('symbol_offsets', 4 * (self.n_symbols + 1)),
+                           ('symbol_text', symbol_bytes),
+                           ('lhs', 4 * self.n_rules),
+                           ('rhs_starts', 4 * (self.n_rules + 1)),
+                           ('rhs', 4 * n_rhs),
+                           ('key_offsets', 4 * (self.n_keys + 1)),
+                           ('key_text', key_bytes),
+                           ('posting_starts', 4 * (self.n_keys + 1)),
+                           ('postings', 4 * n_postings),
+                           ('word_offsets', 4 * (self.n_words + 1)),
+                           ('word_text', word_bytes),
+                           ('entry_starts', 4 * (self.n_words + 1)),
+                           ('entries', 4 * n_entries)):
+            sections[name] = offset
+            offset += size
+        self._at = sections
+        self.state = state
+        self._symbols = {}
+        self._rules = {}
+        self._first = {}
+        self._entries = {}
+        self.grammar = _Rules(self)
+        self.first = _FirstIndex(self)
+        self.lexicon = _Lexicon(self)
+        if self.kind == FEATURES:
+            self.key = features.Grammar.key
+        else:
+            self.key = english.Grammar.key
+
+    def _u32(self, section, i):
+        return U32.unpack_from(self._mm, self._at[section] + 4 * i)[0]
+
+    def _text(self, section, offsets, i):
+        start = self._at[section]
+        return self._mm[start + self._u32(offsets, i):start + self._u32(offsets, i + 1)]
+
+    def _key(self, i):
+        return self._text('key_text', 'key_offsets', i)
+
+    def _word(self, i):
+        return self._text('word_text', 'word_offsets', i)
+
+    def _search(self, get, n, key):
+        """
+        Binary search of a sorted mapped string table.
+        Returns the position of `key`, or None.
+        """
+        lo, hi = 0, n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if get(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == n or get(lo) != key:
+            return None
+        return lo
+
+    def symbol(self, i):
+        """
+        The source text of symbol number `i`.
+        """
+        try:
+            return self._symbols[i]
+        except KeyError:
+            s = self._symbols[i] = self._text('symbol_text', 'symbol_offsets', i)
+            return s
+
+    def rule(self, i):
+        """
+        Decode rule number `i`.
+        """
+        try:
+            return self._rules[i]
+        except KeyError:
+            pass
+        lhs = self.symbol(self._u32('lhs', i))
+        rhs = [self.symbol(self._u32('rhs', j))
+               for j in xrange(self._u32('rhs_starts', i), self._u32('rhs_starts', i + 1))]
+        if self.kind == FEATURES:
+            r = features.ImmutableRule(lhs, rhs)
+        else:
+            r = english.Rule(lhs=lhs, rhs=rhs)
+        self._rules[i] = r
+        return r
+
+    def starting_with(self, key, default=None):
+        """
+        The rules whose first rhs symbol has `key`, found by
+        binary search of the mapped index.
+        """
+        try:
+            r = self._first[key]
+            return default if r is None else r
+        except KeyError:
+            pass
+        lo = self._search(self._key, self.n_keys, key)
+        if lo is None:
+            self._first[key] = None
+            return default
+        r = self._first[key] = [self.rule(self._u32('postings', j))
+                                for j in xrange(self._u32('posting_starts', lo),
+                                                self._u32('posting_starts', lo + 1))]
+        return r
+
+    def categories(self, word, default=None):
+        """
+        The lexical categories of `word`, found by binary
+        search of the mapped lexicon.
+        """
+        try:
+            r = self._entries[word]
+            return default if r is None else r
+        except KeyError:
+            pass
+        i = self._search(self._word, self.n_words, word)
+        if i is None:
+            self._entries[word] = None
+            return default
+        cats = [self.symbol(self._u32('entries', j))
+                for j in xrange(self._u32('entry_starts', i), self._u32('entry_starts', i + 1))]
+        if self.kind == FEATURES:
+            cats = [features.ImmutableCategory.from_string(c) for c in cats]
+        r = self._entries[word] = tuple(cats)
+        return r
+
+    @property
+    def symbols(self):
+        try:
+            return self._symbol_table
+        except AttributeError:
+            self._symbol_table = english.symbol_table(self.grammar, self.key)
+            return self._symbol_table
+
+    @property
+    def expansions(self):
+        try:
+            return self._expansions
+        except AttributeError:
+            self._expansions = english.index_expansions(self.grammar, self.key)
+            return self._expansions
+
+    @property
+    def left_corners(self):
+        try:
+            return self._left_corners
+        except AttributeError:
+            self._left_corners = english.left_corner_closure(self.grammar, self.key)
+            return self._left_corners
+
+    @property
+    def left_corner(self):
+        """
+        The networkx left-corner graph, as for `features.Grammar`,
+        built and networkx imported only when it is first asked for.
+        """
+        try:
+            return self._left_corner
+        except AttributeError:
+            import networkx as nx
+            g = nx.DiGraph()
+            for r in self.grammar:
+                g.add_edge(r.lhs, r.rhs[0])
+            self._left_corner = nx.freeze(g)
+            return self._left_corner
+
+    def close(self):
+        self._mm.close()
+
+
+def load_grammar(path, state=None):
+    """
+    Memory-map a grammar written by `write_grammar`.
+    """
+    return MappedGrammar(path, state=state)
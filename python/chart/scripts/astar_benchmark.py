@@ -0,0 +1,65 @@
+"""
+Edges saved by best-first and A* parsing.
+
+Parses some sentences with the probabilistic grammar three ways:
+exhaustively with `chart.Chart`, best first with `chart.ViterbiChart`,
+and with `chart.AStarChart`, which also uses the grammar's outside
+estimates. Reports the edges each one incorporated, the edges A* saved
+compared with exhaustive parsing, and the best time of a few runs.
+The outside estimates are computed before timing starts, as they are
+kept with the cached grammar.
+
+Usage::
+
+	python scripts/astar_benchmark.py [runs]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chart
+import pcfg
+
+SENTENCES = [
+	('S', 'she hit him'),
+	('S', 'the pigeons cage the rats in the room'),
+	('SImp', 'show me a movie where the director is clint eastwood'),
+	('S', 'steve hit the boy in the house in the room on the computer in the cage'),
+	('S', 'the girls program the computers in the room on the pdp11s' + ' and they suffer' * 4),
+	('S', 'the pigeons are punished' + ' and they suffer' * 20),
+]
+
+
+def best_time(make, runs):
+	best = float('inf')
+	for _ in range(runs):
+		start = time.time()
+		ch = make()
+		best = min(best, time.time() - start)
+	return ch, best
+
+
+def main(runs=3):
+	g = pcfg.get_pcfg()
+	print '%5s %9s %9s %9s %7s %9s %9s %9s' % (
+		'words', 'chart', 'viterbi', 'a*', 'saved', 'chart s', 'viterbi s', 'a* s')
+	total = saved = 0
+	for topcat, sentence in SENTENCES:
+		words = sentence.split()
+		g.outside_estimates(topcat, len(words))
+		full, tf = best_time(lambda: chart.Chart(words, grammar=g), runs)
+		v, tv = best_time(lambda: chart.ViterbiChart(words, grammar=g, topcat=topcat), runs)
+		a, ta = best_time(lambda: chart.AStarChart(words, grammar=g, topcat=topcat), runs)
+		assert a.goal == v.goal and a.logprob == v.logprob, 'A* is not optimal for %r' % sentence
+		n = sum(chart.edge_summary(full).values())
+		total += n
+		saved += n - a.popped
+		print '%5d %9d %9d %9d %6.1f%% %9.4f %9.4f %9.4f' % (
+			len(words), n, v.popped, a.popped, 100.0 * (n - a.popped) / n, tf, tv, ta)
+	print 'A* saved %d of %d edges (%.1f%%)' % (saved, total, 100.0 * saved / total)
+
+
+if __name__ == '__main__':
+	main(*map(int, sys.argv[1:]))
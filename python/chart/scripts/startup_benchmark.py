@@ -0,0 +1,56 @@
+"""
+Start-up time budget.
+
+Times ``import chart`` and the first parse in fresh interpreters, and
+fails if either is over budget, or if the heavy optional dependencies
+(numpy and networkx) were imported without being needed.
+
+Usage::
+
+	python scripts/startup_benchmark.py [import_budget_seconds [first_parse_budget_seconds]]
+"""
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import sys, time
+start = time.time()
+import chart
+imported = time.time()
+chart.parse('the pigeons are punished and they suffer'.split(), print_trees=False)
+chart.parse('the pigeons suffer'.split(), use_features=True, print_trees=False)
+parsed = time.time()
+heavy = sorted(m for m in ('numpy', 'networkx') if m in sys.modules)
+print imported - start, parsed - imported, ','.join(heavy)
+"""
+
+
+def measure(runs=5):
+	"""
+	Return the best import time and first-parse time over `runs`
+	fresh interpreters, and the heavy modules they loaded.
+	"""
+	best_import = best_parse = float('inf')
+	heavy = ''
+	for _ in range(runs):
+		out = subprocess.check_output([sys.executable, '-c', PROBE], cwd=HERE).split()
+		best_import = min(best_import, float(out[0]))
+		best_parse = min(best_parse, float(out[1]))
+		heavy = out[2] if len(out) > 2 else ''
+	return best_import, best_parse, heavy
+
+
+def main(import_budget=0.05, parse_budget=0.1):
+	import_time, parse_time, heavy = measure()
+	print 'import chart: %.4f s (budget %.4f s)' % (import_time, import_budget)
+	print 'first parse:  %.4f s (budget %.4f s)' % (parse_time, parse_budget)
+	assert not heavy, 'heavy modules imported at start-up: %s' % heavy
+	assert import_time <= import_budget, 'import is over budget'
+	assert parse_time <= parse_budget, 'first parse is over budget'
+
+
+if __name__ == '__main__':
+	main(*map(float, sys.argv[1:]))
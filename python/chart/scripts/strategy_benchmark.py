@@ -0,0 +1,76 @@
+"""
+Edges built by the bottom-up and top-down strategies.
+
+Parses some sentences with `chart.Chart`, once bottom up and once with
+`chart.TopDownStrategy`, and reports the edges each one built and the
+best time of a few runs. This is done with the English grammar, and
+again with the grammar padded with rules that start with common
+categories but can never be part of a sentence. Bottom-up parsing
+tries those rules wherever they could start, while top-down prediction
+never reaches them.
+
+Usage::
+
+	python scripts/strategy_benchmark.py [runs] [padding]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chart
+import english
+
+SENTENCES = [
+	('S', 'she hit him'),
+	('S', 'the pigeons cage the rats in the room'),
+	('SImp', 'show me a movie where the director is clint eastwood'),
+	('S', 'steve hit the boy in the house in the room on the computer in the cage'),
+	('S', 'the pigeons are punished' + ' and they suffer' * 8),
+]
+
+PADDING_STARTS = ['det', 'n', 'v', 'prep', 'pn', 'Np', 'Vp']
+
+
+def padded_grammar(n):
+	"""
+	The English grammar with `n` extra rules for each of
+	`PADDING_STARTS`, none of them reachable from a sentence.
+	"""
+	extra = ['X%s%d -> %s %s' % (c, k, c, c) for c in PADDING_STARTS for k in range(n)]
+	return english.Grammar('\n'.join([english.RULES] + extra), english.WORDS)
+
+
+def best_time(make, runs):
+	best = float('inf')
+	for _ in range(runs):
+		start = time.time()
+		ch = make()
+		best = min(best, time.time() - start)
+	return ch, best
+
+
+def report(name, g, runs):
+	print name
+	print '%5s %10s %10s %10s %10s' % ('words', 'bottom-up', 'top-down', 'b-u s', 't-d s')
+	totals = [0, 0]
+	for topcat, sentence in SENTENCES:
+		words = sentence.split()
+		bu, tb = best_time(lambda: chart.Chart(words, grammar=g), runs)
+		td, tt = best_time(lambda: chart.Chart(words, grammar=g, strategy=chart.TopDownStrategy(topcat)), runs)
+		assert bu.solutions(topcat) == td.solutions(topcat), 'strategies disagree on %r' % sentence
+		sizes = [sum(chart.edge_summary(ch).values()) for ch in (bu, td)]
+		totals[0] += sizes[0]
+		totals[1] += sizes[1]
+		print '%5d %10d %10d %10.4f %10.4f' % (len(words), sizes[0], sizes[1], tb, tt)
+	print 'total %10d %10d' % tuple(totals)
+
+
+def main(runs=3, padding=20):
+	report('English grammar', english.get_grammar(), runs)
+	report('with %d unreachable rules' % (padding * len(PADDING_STARTS)), padded_grammar(padding), runs)
+
+
+if __name__ == '__main__':
+	main(*map(int, sys.argv[1:]))
@@ -0,0 +1,278 @@
+"""
+Tree serialization
+==================
+
+Writers that stream syntax trees into any file-like object, in
+three formats:
+
+	- ``indented``: one node per line, indented by depth, with
+	  preterminals on the same line as their words, as `chart.treestring`.
+	- ``penn``: Penn Treebank brackets, one tree per line. Brackets in
+	  feature categories are written as square brackets, so that they
+	  cannot be confused with the tree structure.
+	- ``json``: one JSON value per line. A node is an object with a
+	  ``label`` and ``children``; a word is a string.
+
+`write_forest` writes all the parses at once instead, as a packed
+forest in which each shared sub-derivation appears only once.
+
+The writers walk the tree with an explicit stack, and collect their
+output in a buffer that is flushed in large blocks, so the time they
+take is linear in the size of the tree, however deep it is.
+
+Examples
+--------
+
+>>> import sys
+>>> from chart import Tree
+>>> t = Tree('S', [Tree('Np', [Tree('pn', [Tree('they')])]), Tree('Vp', [Tree('v', [Tree('suffer')])])])
+>>> write_tree(t, sys.stdout)
+S
+ Np
+  pn they
+ Vp
+  v suffer
+>>> write_tree(t, sys.stdout, 'penn')
+(S (Np (pn they)) (Vp (v suffer)))
+>>> write_tree(t, sys.stdout, 'json')
+{"label": "S", "children": [{"label": "Np", "children": [{"label": "pn", "children": ["they"]}]}, {"label": "Vp", "children": [{"label": "v", "children": ["suffer"]}]}]}
+
+The two parses of this sentence share everything but the top of
+the tree, so the packed forest shows the two ways of putting the
+clauses together, and writes each clause once:
+
+>>> import chart
+>>> v = chart.parse(('the pigeons are punished' + ' and they suffer' * 2).split(),
+...                 return_chart=True, print_trees=False)
+>>> write_forest(v.forest(), sys.stdout)
+(S (S #17... #25) #29 #38 | #17... (S #25 #29 #38))
+#17... 0:5 = (S (Np (det the) (Nn (n pigeons))) (cop are) (ppart punished)) (conj and)
+#25 5:7 = (S (Np (pn they)) (Vp (v suffer)))
+#29 7:8 = (conj and)
+#38 8:10 = (S (Np (pn they)) (Vp (v suffer)))
+
+The output is as big as the forest, not as the number of trees:
+
+>>> from StringIO import StringIO
+>>> v = chart.parse(('the pigeons are punished' + ' and they suffer' * 20).split(),
+...                 return_chart=True, print_trees=False)
+>>> f, sink = v.forest(), StringIO()
+>>> write_forest(f, sink)
+>>> f.count(), len(f) + f.n_hyperedges, len(sink.getvalue())
+(6564120420, 2954, 31996)
+"""
+
+##
+# license: Apache 2.0
+##
+
+import json
+
+BUFFER_SIZE = 1 << 16
+
+
+class Buffer(object):
+	"""
+	Collects small writes, and passes them on to `out` in blocks
+	of at least `size` characters.
+	"""
+
+	def __init__(self, out, size=BUFFER_SIZE):
+		self.out = out
+		self.size = size
+		self.chunks = []
+		self.length = 0
+
+	def write(self, s):
+		self.chunks.append(s)
+		self.length += len(s)
+		if self.length >= self.size:
+			self.flush()
+
+	def flush(self):
+		if self.chunks:
+			self.out.write("".join(self.chunks))
+			self.chunks = []
+			self.length = 0
+
+
+def write_indented(tree, out, sep=' ', tab=0):
+	"""
+	Write `tree` with one node per line, indented by `sep`
+	once per level, starting at level `tab`.
+	"""
+	stack = [(tree, tab)]
+	while stack:
+		t, depth = stack.pop()
+		if len(t.children) == 1 and t.children[0].children == ():
+			out.write((sep * depth) + str(t.parent) + ' ' + str(t.children[0].parent) + '\n')
+		else:
+			out.write((sep * depth) + str(t.parent) + '\n')
+			stack.extend((child, depth + 1) for child in reversed(t.children))
+
+
+def penn_label(label):
+	"""
+	>>> penn_label('S(num:pl)')
+	'S[num:pl]'
+	"""
+	return str(label).replace('(', '[').replace(')', ']')
+
+
+def write_penn(tree, out):
+	"""
+	Write `tree` in Penn Treebank brackets, on one line.
+	"""
+	stack = [tree]
+	while stack:
+		t = stack.pop()
+		if isinstance(t, str):
+			out.write(t)
+		elif not t.children:
+			out.write(penn_label(t.parent))
+		else:
+			out.write('(' + penn_label(t.parent))
+			stack.append(')')
+			for child in reversed(t.children):
+				stack.append(child)
+				stack.append(' ')
+	out.write('\n')
+
+
+def write_json(tree, out):
+	"""
+	Write `tree` as a JSON value, on one line.
+	"""
+	stack = [tree]
+	while stack:
+		t = stack.pop()
+		if isinstance(t, str):
+			out.write(t)
+		elif not t.children:
+			out.write(json.dumps(str(t.parent)))
+		else:
+			out.write('{"label": %s, "children": [' % json.dumps(str(t.parent)))
+			stack.append(']}')
+			for i, child in enumerate(reversed(t.children)):
+				if i:
+					stack.append(', ')
+				stack.append(child)
+	out.write('\n')
+
+
+def write_packed(forest, out):
+	"""
+	Write a packed forest (see `forest.Forest`) in a bracketed form
+	that prints each shared sub-derivation once, so that its size is
+	linear in the size of the forest, however many trees it holds.
+
+	The first lines are the roots. A constituent used in more than one
+	place is written as a reference ``#n``, and defined once on a line
+	``#n i:j = (...)``, where ``i:j`` is its span. Alternative analyses of a constituent are separated
+	by ``|``. When several analyses share the first daughters of a rule,
+	those daughters are written as a reference ``#n...``, and the
+	alternatives for them are defined on a line ``#n... = ...``.
+	Roots with no trees (see `forest.from_chart`) are left out.
+	"""
+	uses = [0] * len(forest)
+	for r in forest.roots:
+		uses[r] += 1
+	for h in xrange(forest.n_hyperedges):
+		for c in forest.hyperedge(h):
+			uses[c] += 1
+
+	def label(i):
+		return penn_label(forest.symbols[forest.labels[i]])
+
+	def shared(i):
+		return uses[i] > 1 and len(forest.edge_range(i)) > 0
+
+	def named_prefix(i):
+		return uses[i] > 1 or len(forest.edge_range(i)) != 1
+
+	def alternatives(i):
+		items = []
+		for j, h in enumerate(forest.edge_range(i)):
+			if j:
+				items.append(('text', ' |'))
+			items.append(('daughters', h))
+		return items
+
+	def emit(items):
+		stack = items[::-1]
+		while stack:
+			kind, x = stack.pop()
+			if kind == 'text':
+				out.write(x)
+			elif kind == 'node':
+				if not forest.edge_range(x):
+					out.write(label(x))
+				else:
+					stack.append(('text', ')'))
+					stack.extend(alternatives(x)[::-1])
+					stack.append(('text', '(' + label(x)))
+			elif kind == 'daughters':
+				cs = forest.hyperedge(x)
+				stack.append(('daughter', cs[-1]))
+				if len(cs) == 2:
+					stack.append(('prefix', cs[0]))
+			elif kind == 'prefix':
+				if named_prefix(x):
+					out.write(' #%d...' % x)
+				else:
+					stack.append(('daughters', forest.edge_range(x)[0]))
+			elif kind == 'daughter':
+				if shared(x):
+					out.write(' #%d' % x)
+				else:
+					out.write(' ')
+					stack.append(('node', x))
+
+	for r in forest.roots:
+		if r not in forest.dead:
+			emit([('text', '#%d' % r) if shared(r) else ('node', r), ('text', '\n')])
+	for i in xrange(len(forest)):
+		if forest.is_complete(i):
+			if shared(i):
+				emit([('text', '#%d %d:%d = ' % (i, forest.lefts[i], forest.rights[i])), ('node', i), ('text', '\n')])
+		elif named_prefix(i):
+			emit([('text', '#%d... %d:%d =' % (i, forest.lefts[i], forest.rights[i]))] + alternatives(i) + [('text', '\n')])
+
+
+def write_forest(forest, out):
+	"""
+	Write a packed forest to `out` with `write_packed`, through a buffer.
+	"""
+	buf = Buffer(out)
+	write_packed(forest, buf)
+	buf.flush()
+
+
+WRITERS = dict(indented=write_indented, penn=write_penn, json=write_json)
+
+
+def write_tree(tree, out, format='indented', **kwds):
+	"""
+	Write `tree` to the file-like object `out` in `format`,
+	one of ``indented``, ``penn`` or ``json``. Extra keywords go to the writer.
+	"""
+	buf = Buffer(out)
+	WRITERS[format](tree, buf, **kwds)
+	buf.flush()
+
+
+def write_trees(trees, out, format='indented', headers=False, **kwds):
+	"""
+	Stream `trees` to `out`, sharing one buffer. If `headers` is true,
+	each tree is preceded by a line ``Parse n:``. Returns the number of
+	trees written.
+	"""
+	buf = Buffer(out)
+	n = 0
+	for tree in trees:
+		n += 1
+		if headers:
+			buf.write("Parse %d:\n" % n)
+		WRITERS[format](tree, buf, **kwds)
+	buf.flush()
+	return n